@@ -0,0 +1,492 @@
+from PIL import Image, ImageDraw, ImageFilter
+from io import BytesIO
+from datetime import datetime
+from pathlib import Path
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+
+import main
+from main import create_gradient, render_shadow_alpha, GRADIENT_DIRECTIONS
+
+# Capture sizes we care about: a window, 1080p, 4K and a dual 4K desktop
+SIZES = [(800, 600), (1920, 1080), (3840, 2160), (7680, 2160)]
+# Synthetic screenshot contents: UI blocks only, with text, with text and emails
+CONTENTS = ('plain', 'text', 'emails')
+COLORS = ((135, 206, 235), (147, 112, 219))
+# Settings used for the stage timings; shadow and balance on so every stage runs
+SUITE_SETTINGS = dict(corner_radius=20, gradient_colors=COLORS, padding=50,
+                      shadow=20, balance=True)
+# A stage that got this much slower than the baseline, and by at least
+# REGRESSION_MIN_MS, is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+REGRESSION_MIN_MS = 1.0
+# Largest per-pixel difference allowed between tiled and full renders; the
+# shadow is resampled per band, which can round differently
+TILED_TOLERANCE = 2
+# Encoder settings compared by the encode benchmark: the profiles, then
+# single knobs changed from the default PNG
+ENCODE_VARIANTS = [
+    ('default', 'default'),
+    ('interactive', 'interactive'),
+    ('archive', 'archive'),
+    ('png level 9', {'compress_level': 9}),
+    ('png 256 colors', {'colors': 256}),
+    ('webp lossless m0', {'format': 'webp', 'method': 0}),
+    ('webp q90', {'format': 'webp', 'lossless': False, 'quality': 90}),
+    ('avif q80', {'format': 'avif', 'quality': 80, 'speed': 8}),
+    ('jpeg q90', {'format': 'jpeg', 'quality': 90}),
+]
+# Largest per-pixel alpha difference allowed between the fast and the
+# original shadow, out of 255
+SHADOW_TOLERANCE = 12
+
+def legacy_gradient(size, colors):
+    # The original per-row loop from create_rounded_snippet, kept for comparison
+    width, height = size
+    background = Image.new('RGBA', (width, height))
+    draw = ImageDraw.Draw(background)
+    for y in range(height):
+        ratio = y / height
+        r = int(colors[0][0] * (1 - ratio) + colors[1][0] * ratio)
+        g = int(colors[0][1] * (1 - ratio) + colors[1][1] * ratio)
+        b = int(colors[0][2] * (1 - ratio) + colors[1][2] * ratio)
+        draw.line([(0, y), (width, y)], fill=(r, g, b, 255))
+    return background
+
+def legacy_shadow_alpha(size, padding, corner_radius, shadow):
+    # The original full-canvas 15-layer shadow, kept for comparison
+    new_width, new_height = size
+    shadow_img = Image.new('RGBA', size, (0, 0, 0, 0))
+    shadow_draw = ImageDraw.Draw(shadow_img)
+    spread = shadow * 0.7
+    for i in range(15):
+        opacity = int(120 * (1 - i/15))
+        offset = i * (spread/15)
+        shadow_draw.rounded_rectangle(
+            [(padding + offset, padding + offset),
+             (new_width - padding + offset, new_height - padding + offset)],
+            corner_radius, fill=(0, 0, 0, opacity))
+    shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(radius=shadow/4))
+    return shadow_img.getchannel('A')
+
+def legacy_balance(image):
+    # The original balance: two ImageEnhance passes
+    from PIL import ImageEnhance
+    image = ImageEnhance.Contrast(image).enhance(1.2)
+    return ImageEnhance.Brightness(image).enhance(1.1)
+
+def legacy_ocr_image(image, contrast=1.5, sharpness=1.5):
+    # The original OCR preprocessing: enhance a full resolution color copy,
+    # then downscale it and convert it for detection and recognition
+    from PIL import ImageEnhance
+    image = ImageEnhance.Contrast(image).enhance(contrast)
+    image = ImageEnhance.Sharpness(image).enhance(sharpness)
+    if main.OCR_MAX_SIDE and max(image.size) > main.OCR_MAX_SIDE:
+        scale = main.OCR_MAX_SIDE / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)),
+                              max(1, round(image.height * scale))),
+                             Image.Resampling.LANCZOS)
+    return np.array(image.convert('RGB')), np.array(image.convert('L'))
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_gradient(repeat):
+    print(f"{'size':>11} {'legacy ms':>10} {'numpy ms':>10} {'speedup':>8}  identical")
+    for size in SIZES:
+        legacy = best_of(lambda: legacy_gradient(size, COLORS), repeat)
+        fast = best_of(lambda: create_gradient(size, COLORS), repeat)
+        identical = np.array_equal(np.asarray(legacy_gradient(size, COLORS)),
+                                   np.asarray(create_gradient(size, COLORS)))
+        print(f"{size[0]:>5}x{size[1]:<5} {legacy * 1000:>10.1f} {fast * 1000:>10.1f} "
+              f"{legacy / fast:>7.1f}x  {identical}")
+
+    print()
+    stops = ((255, 140, 0), (255, 105, 180), (138, 43, 226))
+    print(f"{'size':>11} " + ' '.join(f"{d + ' ms':>13}" for d in GRADIENT_DIRECTIONS))
+    for size in SIZES:
+        timings = [best_of(lambda: create_gradient(size, stops, direction=d), repeat)
+                   for d in GRADIENT_DIRECTIONS]
+        print(f"{size[0]:>5}x{size[1]:<5} " + ' '.join(f"{t * 1000:>13.1f}" for t in timings))
+
+def bench_shadow(repeat, padding=50, corner_radius=20):
+    # Timing and visual diff of the shadow alpha against the original stack.
+    # Fails if any pixel is off by more than SHADOW_TOLERANCE
+    print(f"{'size':>11} {'shadow':>6} {'legacy ms':>10} {'fast ms':>8} "
+          f"{'speedup':>8} {'max diff':>8} {'mean diff':>9}")
+    worst = 0
+    for size in SIZES:
+        canvas = (size[0] + padding * 2, size[1] + padding * 2)
+        for shadow in (8, 20, 40):
+            legacy = best_of(lambda: legacy_shadow_alpha(canvas, padding, corner_radius, shadow), repeat)
+            fast = best_of(lambda: render_shadow_alpha(canvas, padding, corner_radius, shadow), repeat)
+            diff = np.abs(
+                np.asarray(legacy_shadow_alpha(canvas, padding, corner_radius, shadow), dtype=np.int16)
+                - np.asarray(render_shadow_alpha(canvas, padding, corner_radius, shadow), dtype=np.int16))
+            worst = max(worst, int(diff.max()))
+            print(f"{size[0]:>5}x{size[1]:<5} {shadow:>6} {legacy * 1000:>10.1f} {fast * 1000:>8.1f} "
+                  f"{legacy / fast:>7.1f}x {diff.max():>8} {diff.mean():>9.3f}")
+    if worst > SHADOW_TOLERANCE:
+        raise SystemExit(f"Shadow differs from the original by {worst} levels")
+
+def bench_encode(repeat, sizes=SIZES[:3], content='text'):
+    # Encode time and size of a rendered screenshot for each encoder variant,
+    # relative to the default PNG. Lossless variants must decode to the
+    # exact rendered pixels
+    print(f"{'size':>11} {'variant':>16} {'ms':>8} {'KB':>8} {'time':>6} {'size':>6}  lossless")
+    for size in sizes:
+        rendered = main.render_snippet(make_screenshot(size, content), **SUITE_SETTINGS)
+        reference = np.asarray(rendered)
+        baseline = None
+        for name, encoding in ENCODE_VARIANTS:
+            buffer = BytesIO()
+            def encode():
+                buffer.seek(0)
+                buffer.truncate()
+                main.encode_image(rendered, buffer, encoding)
+            seconds = best_of(encode, repeat)
+            length = buffer.tell()
+            if baseline is None:
+                baseline = seconds, length
+            buffer.seek(0)
+            decoded = np.asarray(Image.open(buffer).convert('RGBA'))
+            lossless = np.array_equal(decoded, reference)
+            print(f"{size[0]:>5}x{size[1]:<5} {name:>16} {seconds * 1000:>8.1f} "
+                  f"{length / 1024:>8.0f} {seconds / baseline[0]:>5.2f}x "
+                  f"{length / baseline[1]:>5.2f}x  {lossless}")
+        print()
+
+def bench_balance(repeat):
+    # The tone table balance against the two ImageEnhance passes, which it
+    # must match exactly, and the greyscale OCR preprocessing against the
+    # original color one
+    print(f"{'size':>11} {'legacy ms':>10} {'lut ms':>8} {'speedup':>8} {'max diff':>8}"
+          f" {'ocr legacy ms':>14} {'ocr grey ms':>12} {'speedup':>8}")
+    worst = 0
+    for size in SIZES:
+        screenshot = make_screenshot(size, 'text').convert('RGBA')
+        legacy = best_of(lambda: legacy_balance(screenshot), repeat)
+        fast = best_of(lambda: main.apply_balance(screenshot), repeat)
+        diff = int(np.abs(np.asarray(legacy_balance(screenshot), dtype=np.int16)
+                          - np.asarray(main.apply_balance(screenshot), dtype=np.int16)).max())
+        worst = max(worst, diff)
+        ocr_legacy = best_of(lambda: legacy_ocr_image(screenshot), repeat)
+        ocr_fast = best_of(lambda: main.prepare_ocr_image(screenshot), repeat)
+        print(f"{size[0]:>5}x{size[1]:<5} {legacy * 1000:>10.1f} {fast * 1000:>8.1f} "
+              f"{legacy / fast:>7.1f}x {diff:>8} {ocr_legacy * 1000:>14.1f} "
+              f"{ocr_fast * 1000:>12.1f} {ocr_legacy / ocr_fast:>7.1f}x")
+    if worst:
+        raise SystemExit(f"Balance differs from ImageEnhance by {worst} levels")
+
+def bench_ocr(repeat, sizes=SIZES, contents=('dialog', 'plain', 'text')):
+    # Region-of-interest OCR against EasyOCR's readtext on the enhanced full
+    # resolution capture, as redaction originally ran it. The number of text
+    # lines each finds is shown next to the timings, so a loss of recall
+    # shows up too
+    if not main.ocr_available():
+        raise SystemExit("EasyOCR is not installed")
+    reader = main.get_ocr_reader()
+    print(f"{'size':>11} {'content':>8} {'readtext ms':>12} {'roi ms':>8} {'speedup':>8}"
+          f" {'lines':>6} {'roi lines':>9}")
+    for size in sizes:
+        for content in contents:
+            screenshot = make_screenshot(size, content)
+            legacy = lambda: reader.readtext(legacy_ocr_image(screenshot)[0])
+            roi = lambda: main.read_text_regions(reader, screenshot)
+            legacy_ms = best_of(legacy, repeat) * 1000
+            roi_ms = best_of(roi, repeat) * 1000
+            print(f"{size[0]:>5}x{size[1]:<5} {content:>8} {legacy_ms:>12.1f} {roi_ms:>8.1f} "
+                  f"{legacy_ms / roi_ms:>7.1f}x {len(legacy()):>6} {len(roi()):>9}")
+
+def make_screenshot(size, content='plain', seed=0):
+    # Synthetic capture: window chrome and panels, optionally lines of text
+    # and email addresses, deterministic for a given seed. 'dialog' is a
+    # mostly empty desktop with one small window of text
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new('RGB', size, (246, 246, 246))
+    draw = ImageDraw.Draw(image)
+    if content == 'dialog':
+        x, y = width // 3, height // 3
+        draw.rounded_rectangle([x, y, x + 480, y + 200], 8, fill=(255, 255, 255),
+                               outline=(200, 200, 200))
+        for row in range(6):
+            draw.text((x + 16, y + 16 + row * 28), f"settings update {row}: status ok",
+                      fill=(30, 30, 30))
+        return image
+    draw.rectangle([0, 0, width, 32], fill=(222, 222, 222))
+    for _ in range(max(4, width * height // 200000)):
+        x, y = rng.randrange(width), rng.randrange(32, height)
+        w, h = rng.randrange(60, 400), rng.randrange(40, 300)
+        color = tuple(rng.randrange(120, 256) for _ in range(3))
+        draw.rounded_rectangle([x, y, x + w, y + h], 8, fill=color)
+    if content in ('text', 'emails'):
+        words = ['report', 'update', 'build', 'settings', 'window', 'preview',
+                 'render', 'status', 'deploy', 'review']
+        for y in range(48, height - 16, 22):
+            for x in range(16, width - 300, 420):
+                line = ' '.join(rng.choice(words) for _ in range(5))
+                if content == 'emails' and rng.random() < 0.15:
+                    line = f"{rng.choice(words)}.{rng.choice(words)}@example.com"
+                draw.text((x, y), line, fill=(30, 30, 30))
+    return image
+
+def peak_rss_mb():
+    # Peak resident memory of this process so far, None where unsupported
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def time_cold(func, repeat):
+    # Best time over repeat runs, with the render caches cleared before each
+    best = float('inf')
+    for _ in range(repeat):
+        main.clear_stage_caches()
+        main._ocr_cache.clear()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_case(size, content, repeat, ocr):
+    # One benchmark case; runs in a fresh process so peak memory is per case
+    main.HEADLESS = True
+    screenshot = make_screenshot(size, content)
+    source_key = main.image_hash(screenshot)
+    baseline_rss = peak_rss_mb()
+    settings = SUITE_SETTINGS
+    padding, radius = settings['padding'], settings['corner_radius']
+    canvas = (size[0] + padding * 2, size[1] + padding * 2)
+    
+    stages = {
+        'gradient': time_cold(lambda: main.render_background(canvas, settings['gradient_colors']), repeat),
+        'shadow': time_cold(lambda: main.render_shadow_layer(canvas, padding, radius, settings['shadow']), repeat),
+        'mask': time_cold(lambda: main.apply_rounded_corners(screenshot.convert('RGBA'), radius),
+                          repeat),
+        'redaction': (time_cold(lambda: main.render_redaction(screenshot, source_key, ('email',)), repeat)
+                      if ocr else None),
+        'balance': time_cold(lambda: main.render_enhancement(screenshot, source_key, radius, True), repeat),
+    }
+    rendered = main.render_snippet(screenshot, redact_emails=ocr, **settings)
+    
+    def encode():
+        buffer = BytesIO()
+        main.encode_image(rendered, buffer)
+        return buffer
+    stages['encode'] = time_cold(encode, repeat)
+    total = time_cold(lambda: main.encode_image(
+        main.render_snippet(screenshot, redact_emails=ocr, **settings), BytesIO()),
+                      repeat)
+    return {
+        'size': list(size),
+        'content': content,
+        'stages_ms': {name: round(t * 1000, 2) if t is not None else None
+                      for name, t in stages.items()},
+        'total_ms': round(total * 1000, 2),
+        'output_bytes': encode().tell(),
+        'baseline_rss_mb': round(baseline_rss, 1) if baseline_rss else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1) if baseline_rss else None,
+    }
+
+def _run_case_star(args):
+    return run_case(*args)
+
+def run_tiled_case(size, output_path, tiled, repeat, band_height):
+    # Full or tiled render of one capture to a PNG file, in a fresh process.
+    # Returns the best time and the peak memory above the baseline
+    main.HEADLESS = True
+    screenshot = make_screenshot(size, 'text')
+    baseline_rss = peak_rss_mb()
+    if tiled:
+        render = lambda: main.write_snippet_tiled(screenshot, output_path,
+                                                  band_height=band_height, **SUITE_SETTINGS)
+    else:
+        render = lambda: main.create_rounded_snippet(screenshot, output_path, **SUITE_SETTINGS)
+    seconds = time_cold(render, repeat)
+    peak = peak_rss_mb()
+    return seconds, (peak - baseline_rss) if peak is not None else None
+
+def _run_tiled_case_star(args):
+    return run_tiled_case(*args)
+
+def bench_tiled(repeat, sizes=SIZES[2:], band_height=main.TILE_BAND_HEIGHT):
+    # Peak memory and time of the tiled renderer against the full-canvas
+    # one. Memory is the peak above the process with the capture loaded.
+    # Fails if the outputs differ by more than TILED_TOLERANCE
+    import tempfile
+    context = multiprocessing.get_context('spawn')
+    print(f"{'size':>11} {'full ms':>8} {'full +MB':>8} {'tiled ms':>9} {'tiled +MB':>9} {'max diff':>8}")
+    worst = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            cells = []
+            outputs = []
+            for tiled in (False, True):
+                output_path = str(Path(directory) / f"{'tiled' if tiled else 'full'}.png")
+                with context.Pool(1) as pool:
+                    seconds, memory = pool.apply(
+                        _run_tiled_case_star, ((size, output_path, tiled, repeat, band_height),))
+                cells.append((seconds, memory))
+                outputs.append(output_path)
+            full, tiled = (np.asarray(Image.open(path).convert('RGBA'), dtype=np.int16)
+                           for path in outputs)
+            diff = int(np.abs(full - tiled).max())
+            worst = max(worst, diff)
+            (full_s, full_mb), (tiled_s, tiled_mb) = cells
+            print(f"{size[0]:>5}x{size[1]:<5} {full_s * 1000:>8.1f} {full_mb or 0:>8.1f} "
+                  f"{tiled_s * 1000:>9.1f} {tiled_mb or 0:>9.1f} {diff:>8}")
+    if worst > TILED_TOLERANCE:
+        raise SystemExit(f"Tiled output differs from the full render by {worst} levels")
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+def bench_suite(repeat, sizes=SIZES, contents=CONTENTS, ocr=None):
+    if ocr is None:
+        ocr = importlib.util.find_spec('easyocr') is not None
+    if not ocr:
+        print("EasyOCR not installed or disabled, skipping the redaction stage")
+    results = []
+    # A new process per case so peak memory of one case doesn't hide the next
+    context = multiprocessing.get_context('spawn')
+    stage_names = ('gradient', 'shadow', 'mask', 'redaction', 'balance', 'encode')
+    print(f"{'size':>11} {'content':>7} " + ' '.join(f"{n:>9}" for n in stage_names)
+          + f" {'total':>9} {'peak MB':>8}")
+    for size in sizes:
+        for content in contents:
+            with context.Pool(1) as pool:
+                result = pool.apply(_run_case_star, ((size, content, repeat, ocr),))
+            results.append(result)
+            cells = [f"{result['stages_ms'][n]:>9.1f}" if result['stages_ms'][n] is not None
+                     else f"{'-':>9}" for n in stage_names]
+            peak = result['peak_rss_mb']
+            print(f"{size[0]:>5}x{size[1]:<5} {content:>7} " + ' '.join(cells)
+                  + f" {result['total_ms']:>9.1f} {peak if peak is not None else '-':>8}")
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pillow': Image.__version__,
+            'numpy': np.__version__,
+            'repeat': repeat,
+            'ocr': ocr,
+        },
+        'results': results,
+    }
+
+def compare_results(current, baseline):
+    # Per-stage ratio against an earlier run; returns the number of regressions
+    previous = {(tuple(r['size']), r['content']): r for r in baseline['results']}
+    regressions = 0
+    print(f"Compared with {baseline['meta'].get('commit')} "
+          f"({baseline['meta'].get('date')}), ratio > 1 is slower")
+    for result in current['results']:
+        old = previous.get((tuple(result['size']), result['content']))
+        if old is None:
+            continue
+        timings = dict(result['stages_ms'], total=result['total_ms'])
+        old_timings = dict(old['stages_ms'], total=old['total_ms'])
+        cells = []
+        for name, value in timings.items():
+            if value is None or not old_timings.get(name):
+                continue
+            ratio = value / old_timings[name]
+            flag = ''
+            if ratio > REGRESSION_THRESHOLD and value - old_timings[name] >= REGRESSION_MIN_MS:
+                flag = ' !'
+                regressions += 1
+            cells.append(f"{name} {ratio:.2f}{flag}")
+        size = result['size']
+        print(f"{size[0]:>5}x{size[1]:<5} {result['content']:>7}  " + ', '.join(cells))
+    return regressions
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark wnapper rendering")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per measurement, the best one is reported")
+    commands = parser.add_subparsers(dest='command')
+    suite_parser = commands.add_parser(
+        'suite', help="Time every render stage on synthetic screenshots (default)")
+    suite_parser.add_argument('--sizes', nargs='+', type=parse_size,
+                              help="Capture sizes such as 1920x1080")
+    suite_parser.add_argument('--contents', nargs='+', choices=CONTENTS)
+    suite_parser.add_argument('--no-ocr', action='store_true',
+                              help="Skip the redaction stage")
+    suite_parser.add_argument('--json', default='benchmark_results.json',
+                              help="Where to save the results")
+    suite_parser.add_argument('--compare',
+                              help="Earlier results file to compare against")
+    commands.add_parser('gradient', help="NumPy gradient against the original loop")
+    commands.add_parser('shadow', help="Fast shadow against the original layer stack")
+    commands.add_parser('balance', help="Tone table balance and greyscale OCR "
+                                         "preprocessing against the originals")
+    ocr_parser = commands.add_parser(
+        'ocr', help="Region-of-interest OCR against readtext (needs EasyOCR)")
+    ocr_parser.add_argument('--sizes', nargs='+', type=parse_size,
+                            help="Capture sizes such as 1920x1080")
+    encode_parser = commands.add_parser(
+        'encode', help="Encode time and file size of the output encoder settings")
+    encode_parser.add_argument('--sizes', nargs='+', type=parse_size,
+                               help="Capture sizes such as 1920x1080")
+    tiled_parser = commands.add_parser(
+        'tiled', help="Peak memory of tiled rendering against a full-canvas render")
+    tiled_parser.add_argument('--sizes', nargs='+', type=parse_size,
+                              help="Capture sizes such as 7680x4320")
+    tiled_parser.add_argument('--band-height', type=int, default=main.TILE_BAND_HEIGHT,
+                              help="Rows per band")
+    args = parser.parse_args()
+    
+    if args.command == 'gradient':
+        bench_gradient(args.repeat)
+    elif args.command == 'shadow':
+        bench_shadow(args.repeat)
+    elif args.command == 'balance':
+        bench_balance(args.repeat)
+    elif args.command == 'ocr':
+        bench_ocr(args.repeat, sizes=args.sizes or SIZES)
+    elif args.command == 'encode':
+        bench_encode(args.repeat, sizes=args.sizes or SIZES[:3])
+    elif args.command == 'tiled':
+        bench_tiled(args.repeat, sizes=args.sizes or SIZES[2:], band_height=args.band_height)
+    else:
+        results = bench_suite(args.repeat,
+                              sizes=getattr(args, 'sizes', None) or SIZES,
+                              contents=getattr(args, 'contents', None) or CONTENTS,
+                              ocr=False if getattr(args, 'no_ocr', False) else None)
+        output = getattr(args, 'json', 'benchmark_results.json')
+        Path(output).write_text(json.dumps(results, indent=2))
+        print(f"Results saved to {output}")
+        baseline = getattr(args, 'compare', None)
+        if baseline:
+            regressions = compare_results(results, json.loads(Path(baseline).read_text()))
+            if regressions:
+                sys.exit(f"{regressions} timings regressed by more than "
+                         f"{(REGRESSION_THRESHOLD - 1) * 100:.0f}%")
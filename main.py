@@ -1,43 +1,519 @@
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageTk
 from pathlib import Path
 import numpy as np
-import keyboard
-import pyautogui
 import tkinter as tk
 from datetime import datetime
 import tkinter.ttk as ttk
 import re
 import sys
+import threading
+import os
+import glob
+import argparse
+import contextlib
+import queue
+import time
+import hashlib
+import functools
+import json
+import struct
+import zlib
+from collections import OrderedDict, deque, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit, parse_qs
 
-def create_rounded_snippet(input_path, output_path, corner_radius=20,
-                         gradient_colors=((135, 206, 235), (147, 112, 219)),
-                         padding=50, shadow=0, balance=False, redact_emails=False):
-    # Open the original screenshot
-    original = Image.open(input_path)
+GRADIENT_DIRECTIONS = ('vertical', 'horizontal', 'diagonal', 'radial')
+# Diagonal and radial gradients are smooth, so they are computed on a grid of
+# at most this many pixels per side and upscaled by Pillow
+GRADIENT_GRID = 256
+
+def _gradient_ratio(size, direction):
+    # Position of every pixel along the gradient, from 0.0 to 1.0
+    width, height = size
+    if direction == 'vertical':
+        return (np.arange(height, dtype=np.float64) / height)[:, None]
+    if direction == 'horizontal':
+        return (np.arange(width, dtype=np.float64) / width)[None, :]
+    ys = (np.arange(height, dtype=np.float64) + 0.5)[:, None] / height
+    xs = (np.arange(width, dtype=np.float64) + 0.5)[None, :] / width
+    if direction == 'diagonal':
+        return (xs + ys) / 2
+    if direction == 'radial':
+        return np.minimum(np.hypot(xs - 0.5, ys - 0.5) / np.sqrt(0.5), 1.0)
+    raise ValueError(f"Unknown gradient direction: {direction!r}")
+
+def gradient_tile(size, colors, direction='vertical', stops=None):
+    # The 1-D strip or small grid a gradient of the given size is stretched
+    # from, and the resampling filter that stretches it. Built with NumPy
+    # instead of one draw call per row; any number of colors is accepted,
+    # stops default to evenly spaced
+    colors = np.asarray(colors, dtype=np.float64)[:, :3]
+    if len(colors) < 2:
+        raise ValueError("A gradient needs at least two colors")
+    if stops is None:
+        stops = np.linspace(0.0, 1.0, len(colors))
+    else:
+        stops = np.asarray(stops, dtype=np.float64)
+        if len(stops) != len(colors):
+            raise ValueError("Gradient stops must match the number of colors")
+
+    width, height = size
+    if direction in ('vertical', 'horizontal'):
+        grid = size
+    else:
+        scale = min(1.0, GRADIENT_GRID / max(width, height))
+        grid = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    def build():
+        ratio = _gradient_ratio(grid, direction)
+
+        # Pick the segment each pixel falls into and blend its two end colors
+        segment = np.clip(np.searchsorted(stops, ratio, side='right') - 1, 0, len(stops) - 2)
+        start, end = stops[segment], stops[segment + 1]
+        span = np.where(end > start, end - start, 1.0)
+        local = np.clip((ratio - start) / span, 0.0, 1.0)[..., None]
+        rgb = colors[segment] * (1 - local) + colors[segment + 1] * local
+
+        pixels = np.empty(ratio.shape + (4,), dtype=np.uint8)
+        pixels[..., :3] = rgb.astype(np.uint8)
+        pixels[..., 3] = 255
+        return Image.fromarray(pixels, 'RGBA')
+
+    # Only the 1-D strip or the small grid is kept as an asset
+    gradient = load_asset('gradient', (grid, direction, colors.tolist(), stops.tolist()),
+                          build)
+    if direction in ('vertical', 'horizontal'):
+        return gradient, Image.Resampling.NEAREST
+    return gradient, Image.Resampling.BILINEAR
+
+def create_gradient(size, colors, direction='vertical', stops=None):
+    # Linear gradients are computed as a single row or column and stretched
+    # by Pillow, diagonal and radial ones on a small grid
+    gradient, resample = gradient_tile(size, colors, direction, stops)
+    if gradient.size == size:
+        return gradient
+    return gradient.resize(size, resample)
+
+def stretch_band(tile, size, top, bottom, resample):
+    # Rows top to bottom of tile stretched to size, without stretching the
+    # rest. Matches the rows of the fully stretched image to within rounding
+    width, height = size
+    if tile.size == size:
+        return tile.crop((0, top, width, bottom))
+    scale = tile.height / height
+    return tile.resize((width, bottom - top), resample,
+                       box=(0, top * scale, tile.width, bottom * scale))
+
+# Set when running without a GUI (batch mode); errors are printed instead of
+# shown in dialogs
+HEADLESS = False
+
+# EasyOCR settings. Loading the models takes seconds and a few hundred MB,
+# so readers are created once per process and shared by every render
+OCR_LANGUAGES = ('en',)
+OCR_THREADS = None  # torch CPU threads, None keeps the library default
+
+_ocr_readers = {}
+_ocr_lock = threading.Lock()
+
+def get_ocr_reader(languages=None, threads=None):
+    languages = tuple(languages or OCR_LANGUAGES)
+    threads = threads if threads is not None else OCR_THREADS
+    with _ocr_lock:
+        reader = _ocr_readers.get(languages)
+        if reader is None:
+            import easyocr
+            if threads:
+                import torch
+                torch.set_num_threads(threads)
+            reader = easyocr.Reader(list(languages))
+            _ocr_readers[languages] = reader
+    return reader
+
+def warmup_ocr_reader(languages=None, threads=None):
+    # Load the reader in the background so the first redaction only pays
+    # for inference. Errors are ignored here and reported on first real use
+    def load():
+        try:
+            reader = get_ocr_reader(languages, threads)
+            # One tiny inference initialises the remaining lazy state
+            reader.readtext(np.zeros((32, 32, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"OCR warmup skipped: {e}")
+    thread = threading.Thread(target=load, name='ocr-warmup', daemon=True)
+    thread.start()
+    return thread
+
+@functools.lru_cache(maxsize=None)
+def ocr_available():
+    # Looks for EasyOCR without importing it; the import pulls in torch and
+    # takes seconds, so it only happens on the OCR warmup thread
+    import importlib.util
+    return importlib.util.find_spec('easyocr') is not None
+
+# OCR results keyed by source pixels and preprocessing parameters. The memory
+# cache is LRU-bounded; set OCR_CACHE_DIR to a folder to also keep results
+# on disk between runs
+OCR_CACHE_SIZE = 32
+OCR_CACHE_DIR = None
+
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+def image_hash(image):
+    # Content hash of the pixels, independent of file name or metadata
+    digest = hashlib.sha1()
+    digest.update(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def _ocr_cache_key(image, contrast, sharpness, languages):
+    # 'roi' marks results of detection on a small copy and recognition of
+    # the detected boxes
+    params = json.dumps([contrast, sharpness, list(languages), OCR_MAX_SIDE,
+                         OCR_DETECT_MAX_SIDE, 'roi'])
+    return hashlib.sha1(f"{image_hash(image)}:{params}".encode()).hexdigest()
+
+def _ocr_cache_get(key):
+    with _ocr_cache_lock:
+        if key in _ocr_cache:
+            _ocr_cache.move_to_end(key)
+            return _ocr_cache[key]
+    if OCR_CACHE_DIR:
+        path = Path(OCR_CACHE_DIR) / f"{key}.json"
+        try:
+            results = [(bbox, text, conf) for bbox, text, conf
+                       in json.loads(path.read_text())]
+        except (OSError, ValueError):
+            return None
+        _ocr_cache_put(key, results, persist=False)
+        return results
+    return None
+
+def _ocr_cache_put(key, results, persist=True):
+    with _ocr_cache_lock:
+        _ocr_cache[key] = results
+        _ocr_cache.move_to_end(key)
+        while len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+    if persist and OCR_CACHE_DIR:
+        try:
+            cache_dir = Path(OCR_CACHE_DIR)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            (cache_dir / f"{key}.json").write_text(json.dumps(results))
+        except OSError as e:
+            print(f"OCR cache write error: {e}")
+
+# Region-of-interest OCR. Detection is the costly step and only has to find
+# where text is, so it runs on an enhanced greyscale copy of at most
+# OCR_DETECT_MAX_SIDE pixels per side. EasyOCR shrinks its input to that
+# canvas size anyway, so nothing is missed that readtext would find.
+# Recognition then reads each detected box from the full resolution capture,
+# enhancing only the boxes, so small text stays legible. OCR_MAX_SIDE (e.g.
+# 2560) caps the recognition resolution too, for speed. Off by default: on 4K
+# and multi-monitor captures it can lose small text, which then goes
+# unredacted
+OCR_DETECT_MAX_SIDE = 2560
+OCR_MAX_SIDE = None
+# EasyOCR's smallest text box (its min_size), in pixels of the capture
+OCR_MIN_TEXT_SIZE = 20
+# Pixels around each box that are enhanced too, so sharpening at the edge of
+# a box matches a whole-image pass
+OCR_BOX_MARGIN = 4
+# Blocks of the detection image whose grey levels span less than
+# OCR_FLAT_RANGE can't hold text. Detection only runs on rectangles cut
+# around the other blocks, with a block of margin, unless they cover most of
+# the image anyway
+OCR_FLAT_BLOCK = 32
+OCR_FLAT_RANGE = 16
+OCR_REGION_MAX_COVER = 0.8
+
+def _downscale_grey(grey, max_side):
+    # grey shrunk to max_side pixels per side, and its scale
+    if not max_side or max(grey.size) <= max_side:
+        return grey, 1.0
+    scale = max_side / max(grey.size)
+    return grey.resize((max(1, round(grey.width * scale)),
+                        max(1, round(grey.height * scale))),
+                       Image.Resampling.LANCZOS, reducing_gap=3.0), scale
+
+def _enhance_grey(grey, contrast, sharpness, mean):
+    # Contrast around the capture's mean, through the tone table, then
+    # sharpening
+    if contrast != 1.0:
+        grey = grey.point(tone_lut(mean, contrast))
+    if sharpness != 1.0:
+        from PIL import ImageEnhance
+        grey = ImageEnhance.Sharpness(grey).enhance(sharpness)
+    return grey
+
+def prepare_ocr_image(image, contrast=1.5, sharpness=1.5):
+    # Greyscale copies for OCR. Returns the enhanced detection image as a
+    # NumPy array with its scale relative to the recognition image, and the
+    # recognition image (not yet enhanced) with its scale relative to image,
+    # and the mean the contrast is taken around
+    grey, scale = _downscale_grey(image.convert('L'), OCR_MAX_SIDE)
+    detect, detect_scale = _downscale_grey(grey, OCR_DETECT_MAX_SIDE)
+    mean = balance_mean(detect)
+    detect = _enhance_grey(detect, contrast, sharpness, mean)
+    return np.array(detect), detect_scale, grey, scale, mean
+
+def _runs(flags):
+    # (start, end) of every run of True in a 1-D array
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+def _xy_cut(mask, top, left, regions):
+    # Split mask along empty rows, then empty columns, until no split is left
+    for r0, r1 in _runs(mask.any(axis=1)):
+        band = mask[r0:r1]
+        for c0, c1 in _runs(band.any(axis=0)):
+            if (r1 - r0, c1 - c0) == mask.shape:
+                regions.append((left + c0, top + r0, left + c1, top + r1))
+            else:
+                _xy_cut(band[:, c0:c1], top + r0, left + c0, regions)
+
+def text_regions(detect):
+    # Rectangles (x1, y1, x2, y2) of the detection image that may hold text
+    height, width = detect.shape
+    block = OCR_FLAT_BLOCK
+    rows, cols = -(-height // block), -(-width // block)
+    padded = np.pad(detect, ((0, rows * block - height), (0, cols * block - width)),
+                    mode='edge').reshape(rows, block, cols, block)
+    busy = (padded.max(axis=(1, 3)).astype(np.int16)
+            - padded.min(axis=(1, 3))) >= OCR_FLAT_RANGE
+    # A block of context on every side
+    grown = busy.copy()
+    grown[1:] |= busy[:-1]
+    grown[:-1] |= busy[1:]
+    busy = grown.copy()
+    busy[:, 1:] |= grown[:, :-1]
+    busy[:, :-1] |= grown[:, 1:]
+    regions = []
+    _xy_cut(busy, 0, 0, regions)
+    return [(int(x1) * block, int(y1) * block,
+             min(width, int(x2) * block), min(height, int(y2) * block))
+            for x1, y1, x2, y2 in regions]
+
+def read_text_regions(reader, image, contrast=1.5, sharpness=1.5):
+    # reader.readtext for a capture: detection on the parts of the small copy
+    # that aren't flat, recognition of the detected boxes only, at full
+    # resolution. Boxes are in image pixels
+    detect, detect_scale, grey, scale, mean = prepare_ocr_image(image, contrast, sharpness)
+    regions = text_regions(detect)
+    if sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) > \
+            OCR_REGION_MAX_COVER * detect.size:
+        regions = [(0, 0, detect.shape[1], detect.shape[0])]
     
-    # Create a new image with padding for the gradient background
-    new_width = original.width + (padding * 2)
-    new_height = original.height + (padding * 2)
+    # Detected boxes, in recognition image pixels
+    min_size = max(1, round(OCR_MIN_TEXT_SIZE * scale * detect_scale))
+    horizontal, free = [], []
+    for x1, y1, x2, y2 in regions:
+        horizontal_list, free_list = reader.detect(detect[y1:y2, x1:x2], min_size=min_size)
+        horizontal += [[round((bx1 + x1) / detect_scale), round((bx2 + x1) / detect_scale),
+                        round((by1 + y1) / detect_scale), round((by2 + y1) / detect_scale)]
+                       for bx1, bx2, by1, by2 in horizontal_list[0]]
+        free += [[[round((x + x1) / detect_scale), round((y + y1) / detect_scale)]
+                  for x, y in box] for box in free_list[0]]
+    if not horizontal and not free:
+        return []
     
-    # Create gradient background
-    background = Image.new('RGBA', (new_width, new_height))
-    draw = ImageDraw.Draw(background)
+    # Enhance just the boxes, from the plain image so overlaps don't stack
+    recognise = grey.copy()
+    bounds = [(x1, y1, x2, y2) for x1, x2, y1, y2 in horizontal]
+    bounds += [(min(x for x, _ in box), min(y for _, y in box),
+                max(x for x, _ in box), max(y for _, y in box)) for box in free]
+    margin = OCR_BOX_MARGIN
+    for x1, y1, x2, y2 in bounds:
+        box = (max(0, x1 - margin), max(0, y1 - margin),
+               min(grey.width, x2 + margin), min(grey.height, y2 + margin))
+        if box[2] > box[0] and box[3] > box[1]:
+            recognise.paste(_enhance_grey(grey.crop(box), contrast, sharpness, mean), box)
     
-    # Create gradient
-    if gradient_colors:
-        for y in range(new_height):
-            ratio = y / new_height
-            r = int(gradient_colors[0][0] * (1 - ratio) + gradient_colors[1][0] * ratio)
-            g = int(gradient_colors[0][1] * (1 - ratio) + gradient_colors[1][1] * ratio)
-            b = int(gradient_colors[0][2] * (1 - ratio) + gradient_colors[1][2] * ratio)
-            draw.line([(0, y), (new_width, y)], fill=(r, g, b, 255))
-    else:
-        background = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
+    results = reader.recognize(np.array(recognise), horizontal_list=horizontal,
+                               free_list=free)
+    return [([[x / scale, y / scale] for x, y in bbox], text, conf)
+            for bbox, text, conf in results]
+
+def read_text_cached(image, contrast=1.5, sharpness=1.5, languages=None):
+    # OCR of an enhanced greyscale copy of the image, memoized
+    languages = tuple(languages or OCR_LANGUAGES)
+    key = _ocr_cache_key(image, contrast, sharpness, languages)
+    results = _ocr_cache_get(key)
+    if results is not None:
+        return results
+
+    reader = get_ocr_reader(languages)
+    # Keep plain Python types so results can be stored as JSON
+    results = [([[float(x), float(y)] for x, y in bbox], str(text), float(conf))
+               for bbox, text, conf in read_text_regions(reader, image, contrast, sharpness)]
+    _ocr_cache_put(key, results)
+    return results
+
+# Each render stage keeps its last few outputs keyed on only the parameters
+# it depends on, so changing one setting recomputes only the stages that
+# actually use it. Cached images are shared and must not be modified. Each
+# stage also has a byte budget: full resolution renders of large captures
+# (Apply, batch, the server) don't fit and are never kept, so a long-running
+# process doesn't hold on to canvas-sized images that won't be asked for again
+STAGE_CACHE_SIZE = 3
+STAGE_CACHE_BYTES = 16 * 1024 ** 2
+
+_stage_caches = {}
+_stage_lock = threading.Lock()
+
+def _stage_bytes(value):
+    # Pixel memory of a stage output: an image, or a tuple holding images
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, tuple):
+        return sum(_stage_bytes(v) for v in value)
+    return 0
+
+def _memoize_stage(stage, key, build):
+    with _stage_lock:
+        cache = _stage_caches.setdefault(stage, OrderedDict())
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key][0]
+    value = build()
+    size = _stage_bytes(value)
+    if size > STAGE_CACHE_BYTES:
+        return value
+    with _stage_lock:
+        cache[key] = (value, size)
+        while (len(cache) > STAGE_CACHE_SIZE
+               or sum(entry[1] for entry in cache.values()) > STAGE_CACHE_BYTES):
+            cache.popitem(last=False)
+    return value
+
+def clear_stage_caches():
+    # Drop every in-memory render cache, including the derived assets, so the
+    # next render starts cold
+    with _stage_lock:
+        _stage_caches.clear()
+    with _asset_lock:
+        _assets.clear()
+    corner_masks.cache_clear()
+
+def _is_int(value):
+    # JSON integer; bool is an int subclass but not a valid number here
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _freeze(value):
+    # Turn nested lists (e.g. colors loaded from JSON) into hashable tuples
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+# Small derived assets (gradient grids, corner masks, low resolution shadow
+# tiles) are kept in memory. When ASSET_CACHE_DIR is set, those built inside
+# persist_assets() (warmup and Apply, never previews) are also written as PNG
+# files, so a new process starts with them already computed. The directory
+# is trimmed to ASSET_CACHE_MAX_BYTES, least recently used first
+ASSET_CACHE_DIR = None
+ASSET_CACHE_SIZE = 256
+ASSET_CACHE_MAX_BYTES = 64 * 1024 ** 2
+
+_assets = OrderedDict()
+_asset_lock = threading.Lock()
+_asset_writes = threading.local()
+
+@contextlib.contextmanager
+def persist_assets():
+    # Write the assets this thread loads inside the block to ASSET_CACHE_DIR
+    _asset_writes.enabled = True
+    try:
+        yield
+    finally:
+        _asset_writes.enabled = False
+        trim_asset_cache()
+
+def trim_asset_cache(max_bytes=None):
+    # Delete the least recently used asset files past max_bytes
+    if not ASSET_CACHE_DIR:
+        return
+    max_bytes = ASSET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        files = [(entry.stat().st_mtime, entry.stat().st_size, entry)
+                 for entry in Path(ASSET_CACHE_DIR).glob('*.png')]
+    except OSError as e:
+        print(f"Asset cache trim error: {e}")
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, entry in sorted(files, key=lambda f: f[0]):
+        if total <= max_bytes:
+            break
+        try:
+            entry.unlink()
+            total -= size
+        except OSError as e:
+            print(f"Asset cache trim error: {e}")
+
+def load_asset(kind, params, build):
+    # Memoized build() returning a small image; params must have a stable repr
+    key = f"{kind}-{hashlib.sha1(repr(params).encode()).hexdigest()[:20]}"
+    path = Path(ASSET_CACHE_DIR) / f"{key}.png" if ASSET_CACHE_DIR else None
+    persist = getattr(_asset_writes, 'enabled', False)
+    with _asset_lock:
+        asset = _assets.get(key)
+        if asset is not None:
+            _assets.move_to_end(key)
+    if asset is not None:
+        if persist and path is not None and not path.exists():
+            _write_asset(asset, path)
+        return asset
+    if path is not None and path.exists():
+        try:
+            asset = Image.open(path)
+            asset.load()
+            # Mark it as recently used for trim_asset_cache
+            os.utime(path)
+        except OSError:
+            asset = None
+    if asset is None:
+        asset = build()
+        if persist and path is not None:
+            _write_asset(asset, path)
+    with _asset_lock:
+        _assets[key] = asset
+        while len(_assets) > ASSET_CACHE_SIZE:
+            _assets.popitem(last=False)
+    return asset
+
+def _write_asset(asset, path):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        asset.save(path, 'PNG', compress_level=1)
+    except OSError as e:
+        print(f"Asset cache write error: {e}")
+
+def render_background(size, gradient_colors, direction='vertical', stops=None):
+    def build():
+        if gradient_colors:
+            return create_gradient(size, gradient_colors, direction=direction, stops=stops)
+        return Image.new('RGBA', size, (0, 0, 0, 0))
+    key = (size, _freeze(gradient_colors), direction, _freeze(stops))
+    return _memoize_stage('background', key, build)
+
+# The shadow is drawn and blurred at reduced resolution and then upsampled.
+# Blurred edges carry no fine detail, so the scale is picked to keep about
+# this many low resolution pixels of blur radius
+SHADOW_BLUR_DETAIL = 2.0
+
+def shadow_tile(size, padding, corner_radius, shadow):
+    # Blurred shadow alpha at reduced resolution, as an 'L' image that is
+    # stretched to size with bilinear resampling
+    new_width, new_height = size
+    blur = shadow / 4
+    scale = min(1.0, SHADOW_BLUR_DETAIL / blur) if blur > 0 else 1.0
+    small = (max(1, round(new_width * scale)), max(1, round(new_height * scale)))
+    sx, sy = small[0] / new_width, small[1] / new_height
     
-    # Improved shadow effect
-    if shadow > 0:
-        shadow_img = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
-        shadow_draw = ImageDraw.Draw(shadow_img)
+    def build():
+        alpha = Image.new('L', small, 0)
+        alpha_draw = ImageDraw.Draw(alpha)
         
         # Create multiple layers of shadow for a softer effect
         max_layers = 15
@@ -50,123 +526,1176 @@ def create_rounded_snippet(input_path, output_path, corner_radius=20,
             offset = i * (spread/max_layers)
             
             # Draw shadow layer with rounded corners
-            shadow_draw.rounded_rectangle(
-                [(padding + offset, padding + offset),
-                 (new_width - padding + offset, new_height - padding + offset)],
-                corner_radius,
-                fill=(0, 0, 0, opacity)
+            alpha_draw.rounded_rectangle(
+                [((padding + offset) * sx, (padding + offset) * sy),
+                 ((new_width - padding + offset) * sx, (new_height - padding + offset) * sy)],
+                corner_radius * min(sx, sy),
+                fill=opacity
             )
         
         # Apply Gaussian-like blur to the shadow
         from PIL import ImageFilter
-        shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(radius=shadow/4))
-        background = Image.alpha_composite(background, shadow_img)
+        return alpha.filter(ImageFilter.GaussianBlur(radius=blur * min(sx, sy)))
     
-    # Create mask for rounded corners
-    mask = Image.new('L', (original.width, original.height), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.rounded_rectangle([(0, 0), (original.width-1, original.height-1)], 
-                              corner_radius, fill=255)
-    
-    # Improved email redaction
-    if redact_emails:
-        try:
-            import easyocr
-            from PIL import ImageEnhance
+    # The blurred tile is small unless the blur is; only those are kept
+    if scale < 1.0:
+        return load_asset('shadow', (size, padding, corner_radius, shadow), build)
+    return build()
 
-            # Prepare image for better OCR
-            ocr_image = original.copy()
-            
-            # Enhance image for better text detection
-            enhancer = ImageEnhance.Contrast(ocr_image)
-            ocr_image = enhancer.enhance(1.5)
-            enhancer = ImageEnhance.Sharpness(ocr_image)
-            ocr_image = enhancer.enhance(1.5)
-
-            # Initialize EasyOCR with multiple languages for better detection
-            reader = easyocr.Reader(['en'])
-            
-            # Read text from image
-            results = reader.readtext(np.array(ocr_image))
+def render_shadow_alpha(size, padding, corner_radius, shadow):
+    # Alpha channel of the shadow as an 'L' image of the full canvas size
+    alpha = shadow_tile(size, padding, corner_radius, shadow)
+    # Scale it back up to the canvas
+    if alpha.size != size:
+        alpha = alpha.resize(size, Image.Resampling.BILINEAR)
+    return alpha
+
+def render_shadow_layer(size, padding, corner_radius, shadow):
+    # Full-canvas RGBA shadow for the screenshot, or None without shadow
+    def build():
+        shadow_img = Image.new('RGBA', size, (0, 0, 0, 0))
+        shadow_img.putalpha(render_shadow_alpha(size, padding, corner_radius, shadow))
+        return shadow_img
+
+    if shadow <= 0:
+        return None
+    return _memoize_stage('shadow', (size, padding, corner_radius, shadow), build)
+
+# Rounded corners are drawn this many times larger and averaged down, so
+# their edges are antialiased
+CORNER_SUPERSAMPLE = 4
+
+@functools.lru_cache(maxsize=16)
+def corner_masks(radius):
+    # Alpha of the four corners of a rounded rectangle as 'L' images:
+    # top-left, top-right, bottom-left, bottom-right
+    def build():
+        big = radius * CORNER_SUPERSAMPLE
+        circle = Image.new('L', (big * 2, big * 2), 0)
+        ImageDraw.Draw(circle).ellipse([0, 0, big * 2 - 1, big * 2 - 1], fill=255)
+        return circle.crop((0, 0, big, big)).resize((radius, radius), Image.Resampling.BOX)
+    top_left = load_asset('corner', (radius, CORNER_SUPERSAMPLE), build)
+    return (top_left,
+            top_left.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+            top_left.transpose(Image.Transpose.FLIP_TOP_BOTTOM),
+            top_left.transpose(Image.Transpose.ROTATE_180))
+
+def _corner_boxes(size, corner_radius):
+    # Effective radius and the four corner rectangles, matching corner_masks
+    width, height = size
+    radius = int(min(corner_radius, width // 2, height // 2))
+    return radius, [(0, 0, radius, radius),
+                    (width - radius, 0, width, radius),
+                    (0, height - radius, radius, height),
+                    (width - radius, height - radius, width, height)]
+
+def apply_rounded_corners(image, corner_radius):
+    # Round the corners of an RGBA image in place by scaling the alpha of the
+    # corner regions only
+    from PIL import ImageChops
+    radius, boxes = _corner_boxes(image.size, corner_radius)
+    if radius <= 0:
+        return image
+    for corner, box in zip(corner_masks(radius), boxes):
+        region = image.crop(box)
+        region.putalpha(ImageChops.multiply(region.getchannel('A'), corner))
+        image.paste(region, box)
+    return image
+
+# Sensitive text found by OCR. Every detector is a regex; the enabled ones
+# are compiled together into a single alternation, so each OCR line is
+# scanned once however many detectors are on
+PII_DETECTORS = {
+    'email': r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    # International (+country code), or national with a telltale shape: an
+    # area code in parentheses, a leading trunk 0, or 555-123-4567. Bare digit
+    # runs, dates, times and ISBNs don't match
+    'phone': r'(?<![\w.+-])(?:'
+             r'\+(?=(?:[ ().-]*\d){8})\d{1,3}(?:[ .-]?\(\d{1,4}\))?(?:[ .-]?\d{1,5}){1,5}'
+             r'|\(\d{2,4}\)[ .-]?\d{3,4}[ .-]?\d{3,4}'
+             r'|0\d{1,4}[ /.-]\d{3,4}(?:[ .-]?\d{2,4})?'
+             r'|\d{3}-\d{3}-\d{4}|\d{3}\.\d{3}\.\d{4}'
+             r')(?![\w.-]?\d)',
+    'iban': r'\b[A-Z]{2}\d{2} ?[A-Z0-9]{4}(?: ?[A-Z0-9]{4}){1,6}(?: ?[A-Z0-9]{1,3})?\b',
+    # Known key prefixes, or a long token mixing upper and lower case with
+    # at least three digits, so long identifiers and words don't count
+    'api_key': r'\b(?:sk|pk|rk|ghp|gho|ghs|xox[abpr]|AKIA|AIza)[-_A-Za-z0-9]{12,}\b'
+               r'|\b(?=[A-Za-z0-9_-]*[a-z])(?=[A-Za-z0-9_-]*[A-Z])'
+               r'(?=(?:[A-Za-z_-]*\d){3})[A-Za-z0-9_-]{32,}\b',
+    'ip': r'\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b',
+}
+# Detectors used when redaction is switched on in the settings window
+DEFAULT_DETECTORS = ('email', 'phone', 'iban', 'api_key', 'ip')
+REDACTION_STYLES = ('solid', 'blur', 'pixelate')
+
+def register_detector(name, pattern):
+    # Add or replace a detector; pattern is checked by compiling it
+    re.compile(pattern)
+    PII_DETECTORS[name] = pattern
+    _compile_detectors.cache_clear()
+
+@functools.lru_cache(maxsize=32)
+def _compile_detectors(names):
+    # One pattern for all detectors, with a numbered group per detector
+    unknown = [name for name in names if name not in PII_DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown PII detectors: {', '.join(unknown)}")
+    combined = '|'.join(f'(?P<d{i}>{PII_DETECTORS[name]})'
+                        for i, name in enumerate(names))
+    return re.compile(combined)
+
+def scan_pii(text, detectors=DEFAULT_DETECTORS):
+    # Names of the detectors matching anywhere in text, with match counts
+    names = tuple(detectors)
+    pattern = _compile_detectors(names)
+    hits = {}
+    for match in pattern.finditer(text):
+        name = names[int(match.lastgroup[1:])]
+        hits[name] = hits.get(name, 0) + 1
+    return hits
+
+def find_pii_boxes(image, detectors=DEFAULT_DETECTORS):
+    # Rectangles around OCR lines with sensitive text, in image pixels, and
+    # the number of hits per detector
+    # OCR results are cached per screenshot, so only the first
+    # preview after a capture pays for text recognition
+    results = read_text_cached(image)
+    
+    boxes = []
+    counts = dict.fromkeys(detectors, 0)
+    for bbox, text, conf in results:
+        hits = scan_pii(text, detectors)
+        if hits:
+            for name, count in hits.items():
+                counts[name] += count
+            # Convert points to rectangle
+            points = np.array(bbox).astype(np.int32)
+            x1, y1 = points.min(axis=0)
+            x2, y2 = points.max(axis=0)
             
-            # Find and redact emails
-            if results:
-                draw = ImageDraw.Draw(original)
-                redacted_count = 0
-                
-                for bbox, text, conf in results:
-                    # Only check lines containing '@'
-                    if '@' in text:
-                        # Standard email pattern
-                        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-                        if re.search(email_pattern, text):
-                            # Convert points to rectangle
-                            points = np.array(bbox).astype(np.int32)
-                            x1, y1 = points.min(axis=0)
-                            x2, y2 = points.max(axis=0)
-                            
-                            # Add padding to redaction
-                            padding_x = int((x2 - x1) * 0.1)
-                            padding_y = int((y2 - y1) * 0.1)
-                            x1 = max(0, x1 - padding_x)
-                            y1 = max(0, y1 - padding_y)
-                            x2 = min(original.width, x2 + padding_x)
-                            y2 = min(original.height, y2 + padding_y)
-                            
-                            # Draw black rectangle over email
-                            draw.rectangle([x1, y1, x2, y2], fill='black')
-                            redacted_count += 1
-                
-                # Update checkbox text with count if available
-                if 'redact_checkbox' in globals():
-                    redact_checkbox.configure(
-                        text=f"Redact email addresses (found {redacted_count})"
-                    )
+            # Add padding to redaction
+            padding_x = int((x2 - x1) * 0.1)
+            padding_y = int((y2 - y1) * 0.1)
+            x1 = max(0, x1 - padding_x)
+            y1 = max(0, y1 - padding_y)
+            x2 = min(image.width, x2 + padding_x)
+            y2 = min(image.height, y2 + padding_y)
+            boxes.append((int(x1), int(y1), int(x2), int(y2)))
+    return boxes, counts
 
-        except Exception as e:
-            import tkinter.messagebox as messagebox
-            messagebox.showwarning(
-                "Email Redaction Not Available",
-                "To use email redaction, please install EasyOCR:\n\n"
-                "pip install easyocr\n\n"
-                "Note: First use may require downloading model files."
-            )
-            if 'redact_var' in globals():
-                redact_var.set(False)
+def redact_region(image, box, style='solid'):
+    # Hide one rectangle of image in place
+    x1, y1, x2, y2 = box
+    if x2 <= x1 or y2 <= y1:
+        return
+    if style == 'solid':
+        ImageDraw.Draw(image).rectangle([x1, y1, x2, y2], fill='black')
+        return
+    region = image.crop(box)
+    if style == 'blur':
+        from PIL import ImageFilter
+        radius = max(4, (y2 - y1) // 2)
+        region = region.filter(ImageFilter.BoxBlur(radius)).filter(ImageFilter.BoxBlur(radius))
+    elif style == 'pixelate':
+        block = max(4, (y2 - y1) // 3)
+        small = (max(1, (x2 - x1) // block), max(1, (y2 - y1) // block))
+        region = region.resize(small, Image.Resampling.BOX).resize(
+            region.size, Image.Resampling.NEAREST)
+    else:
+        raise ValueError(f"Unknown redaction style: {style!r}")
+    image.paste(region, box)
+
+class RedactionError(RuntimeError):
+    # Redaction was asked for but could not run, e.g. without EasyOCR
+    pass
+
+def check_redaction(detectors, style):
+    # Fail on an unknown detector or style before any OCR runs, rather than
+    # only once text is found
+    if detectors:
+        _compile_detectors(tuple(detectors))
+        if style not in REDACTION_STYLES:
+            raise ValueError(f"Unknown redaction style: {style!r}")
+
+def render_redaction(original, source_key, detectors, style='solid', ocr_source=None):
+    # Copy of the screenshot with sensitive text hidden, and hit counts per
+    # detector. When original is a preview proxy, ocr_source is the full
+    # resolution capture: OCR runs there and the boxes are scaled down
+    def build():
+        redacted = original.copy()
+        boxes, counts = find_pii_boxes(ocr_source or original, detectors)
+        scale = original.width / ocr_source.width if ocr_source else 1.0
+        for x1, y1, x2, y2 in boxes:
+            redact_region(redacted, (int(x1 * scale), int(y1 * scale),
+                                     int(x2 * scale), int(y2 * scale)), style)
+        return redacted, counts
+
+    if not detectors:
+        return original, {}
+    return _memoize_stage('redaction', (source_key, tuple(detectors), style), build)
+
+# Strength of the "balance" option: contrast around the mean grey level,
+# then brightness, then gamma (1.0 leaves tones as they are)
+BALANCE_CONTRAST = 1.2
+BALANCE_BRIGHTNESS = 1.1
+BALANCE_GAMMA = 1.0
+
+def balance_mean(image):
+    # Mean grey level that balance stretches the contrast around
+    from PIL import ImageStat
+    return int(ImageStat.Stat(image.convert('L')).mean[0] + 0.5)
+
+def tone_lut(mean, contrast=1.0, brightness=1.0, gamma=1.0):
+    # 256-entry table for contrast around mean, then brightness, then gamma.
+    # The first two steps are computed, clipped and truncated in float32
+    # like Image.blend does, so with gamma 1.0 the table reproduces
+    # ImageEnhance.Contrast followed by ImageEnhance.Brightness exactly
+    values = np.arange(256, dtype=np.float32)
+    mean = np.float32(mean)
+    values = mean + np.float32(contrast) * (values - mean)
+    values = np.clip(values, 0, 255).astype(np.uint8).astype(np.float32)
+    values = np.clip(np.float32(brightness) * values, 0, 255).astype(np.uint8)
+    if gamma != 1.0:
+        values = np.round(255 * (values / 255.0) ** (1.0 / gamma)).astype(np.uint8)
+    return values.tolist()
+
+def apply_balance(image, mean=None, contrast=None, brightness=None, gamma=None):
+    # Balance in one pass: every color channel goes through the same tone
+    # table, alpha is left as it is. mean can be passed in, so a band of a
+    # larger image is balanced the same way as the whole image. Strengths
+    # default to the BALANCE_ settings
+    if mean is None:
+        mean = balance_mean(image)
+    lut = tone_lut(mean,
+                   BALANCE_CONTRAST if contrast is None else contrast,
+                   BALANCE_BRIGHTNESS if brightness is None else brightness,
+                   BALANCE_GAMMA if gamma is None else gamma)
+    table = lut * 3
+    if image.mode == 'RGBA':
+        table += list(range(256))
+    return image.point(table)
+
+def render_enhancement(image, key, corner_radius, balance):
+    # Screenshot with rounded corners, with optional balance. key identifies
+    # the image contents
+    def build():
+        # Round the corners on a copy of the image
+        output = apply_rounded_corners(image.convert('RGBA'), corner_radius)
+        
+        # Apply balance if requested
+        if balance:
+            output = apply_balance(output)
+        return output
+    strengths = (BALANCE_CONTRAST, BALANCE_BRIGHTNESS, BALANCE_GAMMA) if balance else None
+    return _memoize_stage('enhancement', (key, corner_radius, strengths), build)
+
+def render_composite(background, shadow_layer, foreground, padding, watermark=False):
+    # Final image: background, shadow and screenshot. Always a new image
+    if shadow_layer is not None:
+        canvas = Image.alpha_composite(background, shadow_layer)
+    else:
+        canvas = background.copy()
     
-    # Apply mask to original image
-    output = Image.new('RGBA', (original.width, original.height), (0, 0, 0, 0))
-    output.paste(original, mask=mask)
+    # Composite the final image onto the background. Not paste() with a
+    # mask, which would also blend the alpha and leave antialiased corners
+    # partly transparent
+    canvas.alpha_composite(foreground, (padding, padding))
     
-    # Apply balance if requested
-    if balance:
-        from PIL import ImageEnhance
-        enhancer = ImageEnhance.Contrast(output)
-        output = enhancer.enhance(1.2)
-        enhancer = ImageEnhance.Brightness(output)
-        output = enhancer.enhance(1.1)
+    # Add watermark if requested
+    if watermark:
+        new_width, new_height = canvas.size
+        canvas.alpha_composite(watermark_strip(new_width), (0, new_height-30))
+    return canvas
+
+def watermark_strip(width):
+    # The bottom 30 rows of the watermark layer
+    watermark = Image.new('RGBA', (width, 30), (0, 0, 0, 0))
+    watermark_draw = ImageDraw.Draw(watermark)
+    watermark_draw.text((width-100, 5), "Ralph-o-snapic", fill=(0, 0, 0, 128))
+    return watermark
+
+def show_redaction_unavailable():
+    import tkinter.messagebox as messagebox
+    messagebox.showwarning(
+        "Redaction Not Available",
+        "To use redaction, please install EasyOCR:\n\n"
+        "pip install easyocr\n\n"
+        "Note: First use may require downloading model files."
+    )
+
+def render_snippet(source, corner_radius=20,
+                   gradient_colors=((135, 206, 235), (147, 112, 219)),
+                   padding=50, shadow=0, balance=False, redact_emails=False,
+                   gradient_direction='vertical', gradient_stops=None,
+                   watermark=False, source_key=None, ocr_source=None,
+                   redact=None, redaction_style='solid', stats=None):
+    # Render the styled screenshot and return it as an RGBA image. source is
+    # a path or an already opened image; source_key can be passed to skip
+    # re-hashing a source that is rendered repeatedly. redact lists PII
+    # detectors to apply (redact_emails=True is short for ['email']). If a
+    # stats dict is given, redaction hit counts are stored in it
+    if isinstance(source, Image.Image):
+        original = source
+    else:
+        original = Image.open(source)
+        original.load()
+    if source_key is None:
+        source_key = image_hash(original)
     
-    # Paste the final image onto the background
-    background.paste(output, (padding, padding), output)
+    # Create a new image with padding for the gradient background
+    new_size = (original.width + (padding * 2), original.height + (padding * 2))
     
-    # Add watermark if requested
-    if hasattr(create_rounded_snippet, 'watermark') and create_rounded_snippet.watermark:
-        watermark = Image.new('RGBA', (new_width, 30), (0, 0, 0, 0))
-        watermark_draw = ImageDraw.Draw(watermark)
-        watermark_draw.text((new_width-100, 5), "Ralph-o-snapic", fill=(0, 0, 0, 128))
-        background.paste(watermark, (0, new_height-30), watermark)
+    background = render_background(new_size, gradient_colors,
+                                   gradient_direction, gradient_stops)
+    shadow_layer = render_shadow_layer(new_size, padding, corner_radius, shadow)
+    
+    # Redact sensitive text
+    detectors = tuple(redact) if redact is not None else (('email',) if redact_emails else ())
+    check_redaction(detectors, redaction_style)
+    try:
+        redacted, counts = render_redaction(original, source_key, detectors,
+                                            redaction_style, ocr_source=ocr_source)
+    except Exception as e:
+        if HEADLESS:
+            # Batch, server and history output must never go out unredacted
+            raise RedactionError(f"Redaction failed: {e}") from e
+        if stats is not None:
+            stats['redaction_error'] = str(e)
+        elif not HEADLESS and threading.current_thread() is threading.main_thread():
+            show_redaction_unavailable()
+        else:
+            # No dialogs off the Tk thread
+            print(f"Redaction not available: {e}")
+        redacted, counts, detectors = original, {}, ()
+    if stats is not None:
+        stats['redactions'] = counts
+    
+    foreground = render_enhancement(
+        redacted, (source_key, detectors, redaction_style), corner_radius, balance)
+    
+    return render_composite(background, shadow_layer, foreground, padding,
+                            watermark=watermark)
+
+# Largest preview shown in the settings window
+PREVIEW_SIZE = (600, 400)
+
+def make_proxy(image, max_size=PREVIEW_SIZE):
+    # Downscaled copy of a capture for live previews, made once per capture.
+    # Returns the proxy and its scale relative to the original
+    scale = min(1.0, max_size[0] / image.width, max_size[1] / image.height)
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS), scale
+
+def render_proxy(proxy, scale, original, corner_radius=20, padding=50,
+                 shadow=0, **settings):
+    # Preview render of a proxy: padding, corner radius and shadow are scaled
+    # so it looks like a downscaled full render, at a cost tied to the preview
+    # size. OCR still runs on the original so redaction boxes are accurate
+    return render_snippet(
+        proxy,
+        corner_radius=round(corner_radius * scale),
+        padding=round(padding * scale),
+        shadow=shadow * scale,
+        ocr_source=original if proxy is not original else None,
+        **settings)
+
+# Output encoding. The knobs go to Pillow as they are: compress_level for
+# PNG (zlib 0-9), lossless, quality and method for WebP (method 0-6 trades
+# speed for size), quality and speed for AVIF (speed 0-10), quality for
+# JPEG. colors > 0 quantises PNG output to a palette of that many colors
+OUTPUT_FORMATS = {
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp'),
+    'avif': ('.avif', 'image/avif'),
+    'jpeg': ('.jpg', 'image/jpeg'),
+}
+
+class EncodeSettings(namedtuple('EncodeSettings', (
+        'format', 'compress_level', 'lossless', 'quality', 'method', 'speed',
+        'colors'),
+        defaults=('png', 6, True, 90, 4, 6, 0))):
+    __slots__ = ()
+
+    @property
+    def extension(self):
+        return OUTPUT_FORMATS[self.format][0]
+
+    @property
+    def mime_type(self):
+        return OUTPUT_FORMATS[self.format][1]
+
+ENCODE_PROFILES = {
+    # Pillow's PNG defaults, what was always written before
+    'default': EncodeSettings(),
+    # Fastest PNG, for output someone is waiting on
+    'interactive': EncodeSettings(compress_level=1),
+    # Smallest lossless files, a few times smaller than PNG for screenshots
+    'archive': EncodeSettings(format='webp', lossless=True, quality=90, method=4),
+}
+
+def resolve_encoding(encoding=None):
+    # EncodeSettings from a profile name, or from a dict of knobs that may
+    # name a "profile" to start from
+    if encoding is None:
+        encoding = 'default'
+    if isinstance(encoding, EncodeSettings):
+        return encoding
+    if isinstance(encoding, str):
+        if encoding not in ENCODE_PROFILES:
+            raise ValueError(f"Unknown encoding profile: {encoding}")
+        return ENCODE_PROFILES[encoding]
+    if not isinstance(encoding, dict):
+        raise ValueError("Encoding must be a profile name or an object of settings")
+    values = dict(encoding)
+    settings = resolve_encoding(values.pop('profile', None))._replace(**values)
+    if settings.format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {settings.format}")
+    for name in ('compress_level', 'quality', 'method', 'speed', 'colors'):
+        if not _is_int(getattr(settings, name)):
+            raise ValueError(f"Encoding {name} must be an integer")
+    if not isinstance(settings.lossless, bool):
+        raise ValueError("Encoding lossless must be true or false")
+    return settings
+
+def drop_opaque_alpha(image):
+    # Output with a background is opaque; without the alpha channel it
+    # encodes faster and smaller
+    if image.mode == 'RGBA' and image.getextrema()[3][0] == 255:
+        return image.convert('RGB')
+    return image
+
+def encode_image(image, output, encoding=None):
+    # Write image to a file name or a writable binary buffer. Returns the
+    # EncodeSettings used
+    encoding = resolve_encoding(encoding)
+    image = drop_opaque_alpha(image)
+    if encoding.format == 'png':
+        if encoding.colors:
+            # Fast octree is the quantiser that also handles RGBA
+            image = image.quantize(encoding.colors, method=Image.Quantize.FASTOCTREE)
+        image.save(output, 'PNG', compress_level=encoding.compress_level)
+    elif encoding.format == 'webp':
+        image.save(output, 'WEBP', lossless=encoding.lossless,
+                   quality=encoding.quality, method=encoding.method)
+    elif encoding.format == 'avif':
+        image.save(output, 'AVIF', quality=encoding.quality, speed=encoding.speed)
+    else:
+        if image.mode != 'RGB':
+            raise ValueError("JPEG output needs an opaque image, pick a background")
+        image.save(output, 'JPEG', quality=encoding.quality)
+    return encoding
+
+def create_rounded_snippet(input_path, output_path, corner_radius=20,
+                         gradient_colors=((135, 206, 235), (147, 112, 219)),
+                         padding=50, shadow=0, balance=False, redact_emails=False,
+                         gradient_direction='vertical', gradient_stops=None,
+                         watermark=False, redact=None, redaction_style='solid',
+                         stats=None, encoding=None):
+    # output_path may be a file name or a writable binary buffer. encoding is
+    # an ENCODE_PROFILES name or a dict of encoder knobs, PNG by default
+    background = render_snippet(
+        input_path, corner_radius=corner_radius, gradient_colors=gradient_colors,
+        padding=padding, shadow=shadow, balance=balance,
+        redact_emails=redact_emails, gradient_direction=gradient_direction,
+        gradient_stops=gradient_stops, watermark=watermark, redact=redact,
+        redaction_style=redaction_style, stats=stats)
     
     # Save the final image
-    background.save(output_path, 'PNG')
+    encode_image(background, output_path, encoding)
+    return background
 
-def show_settings(screenshot_path, final_path):
-    # Create settings window
-    settings = tk.Tk()
-    settings.title("Ralph's xnapper copy but opensource")
-    settings.configure(bg='#f5f5f5')  # Light background
+# Very large captures are rendered in bands of this many rows: composited
+# and encoded band by band, so memory use follows the band size and not the
+# canvas size. Batch mode does this for canvases of TILED_MIN_PIXELS or more
+TILE_BAND_HEIGHT = 256
+TILED_MIN_PIXELS = 24_000_000
+
+_PNG_FILTER_COST = np.minimum(np.arange(256), 256 - np.arange(256)).astype(np.uint8)
+
+class PngStreamWriter:
+    # PNG encoder that is given the image a band of rows at a time. Rows are
+    # deflated as they arrive and written out as IDAT chunks, so the whole
+    # image is never in memory. Each row gets the None, Sub or Up filter,
+    # whichever leaves the smallest differences (libpng's heuristic without
+    # the slower Average and Paeth)
+    def __init__(self, output, size, mode='RGBA', compress_level=6):
+        if mode not in ('RGB', 'RGBA'):
+            raise ValueError(f"Unsupported mode for streamed PNG: {mode}")
+        self.size = size
+        self.mode = mode
+        self.rows = 0
+        self._owns_output = not hasattr(output, 'write')
+        self.output = open(output, 'wb') if self._owns_output else output
+        self._deflate = zlib.compressobj(compress_level)
+        width, height = size
+        # Row above the next band, for the Up filter
+        self._previous = np.zeros(width * len(mode), dtype=np.uint8)
+        color_type = 6 if mode == 'RGBA' else 2
+        self.output.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.output.write(struct.pack('>I', len(data)))
+        self.output.write(kind)
+        self.output.write(data)
+        self.output.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def write(self, band):
+        # Append the rows of band, an image as wide as the PNG
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        raw = np.asarray(band).reshape(band.height, -1)
+        bpp = len(self.mode)
+        sub = raw.copy()
+        sub[:, bpp:] -= raw[:, :-bpp]
+        up = raw.copy()
+        up[0] -= self._previous
+        up[1:] -= raw[:-1]
+        self._previous = raw[-1].copy()
+        # Filter type per row: 0 None, 1 Sub, 2 Up. Bytes count as signed
+        # differences, so 255 costs as little as 1
+        costs = np.stack([_PNG_FILTER_COST[rows].sum(axis=1, dtype=np.uint64)
+                          for rows in (raw, sub, up)])
+        filters = costs.argmin(axis=0)
+        rows = np.empty((band.height, raw.shape[1] + 1), dtype=np.uint8)
+        rows[:, 0] = filters
+        rows[:, 1:] = raw
+        rows[filters == 1, 1:] = sub[filters == 1]
+        rows[filters == 2, 1:] = up[filters == 2]
+        data = self._deflate.compress(rows)
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows += band.height
+
+    def close(self):
+        try:
+            if self.rows != self.size[1]:
+                raise ValueError(f"Streamed PNG got {self.rows} of {self.size[1]} rows")
+            self._chunk(b'IDAT', self._deflate.flush())
+            self._chunk(b'IEND', b'')
+        finally:
+            if self._owns_output:
+                self.output.close()
+
+def round_band_corners(band, top, corner_radius, size):
+    # apply_rounded_corners for the rows of an image of the given size that
+    # start at top, in place
+    from PIL import ImageChops
+    radius, boxes = _corner_boxes(size, corner_radius)
+    if radius <= 0:
+        return band
+    bottom = top + band.height
+    for corner, (x1, y1, x2, y2) in zip(corner_masks(radius), boxes):
+        first, last = max(y1, top), min(y2, bottom)
+        if first >= last:
+            continue
+        box = (x1, first - top, x2, last - top)
+        region = band.crop(box)
+        mask = corner.crop((0, first - y1, x2 - x1, last - y1))
+        region.putalpha(ImageChops.multiply(region.getchannel('A'), mask))
+        band.paste(region, box)
+    return band
+
+def write_snippet_tiled(input_path, output_path, corner_radius=20,
+                        gradient_colors=((135, 206, 235), (147, 112, 219)),
+                        padding=50, shadow=0, balance=False, redact_emails=False,
+                        gradient_direction='vertical', gradient_stops=None,
+                        watermark=False, redact=None, redaction_style='solid',
+                        stats=None, encoding=None, band_height=TILE_BAND_HEIGHT):
+    # create_rounded_snippet for captures too large to keep several canvas
+    # sized copies of. Background and shadow are stretched band by band from
+    # their small tiles, the screenshot rows of each band are rounded,
+    # balanced and composited, and the band is encoded before the next one.
+    # Only PNG is written. Returns the output size
+    encoding = resolve_encoding(encoding)
+    if encoding.format != 'png' or encoding.colors:
+        raise ValueError("Tiled rendering only writes PNG without a palette")
+    if isinstance(input_path, Image.Image):
+        original = input_path
+    else:
+        original = Image.open(input_path)
+        original.load()
+    width, height = original.size
+    size = (width + padding * 2, height + padding * 2)
+    
+    # Redaction and the balance mean need the whole screenshot, but only at
+    # its own size
+    detectors = tuple(redact) if redact is not None else (('email',) if redact_emails else ())
+    check_redaction(detectors, redaction_style)
+    counts = {}
+    if detectors:
+        try:
+            original, counts = render_redaction(original, image_hash(original), detectors,
+                                                redaction_style)
+        except Exception as e:
+            if HEADLESS:
+                raise RedactionError(f"Redaction failed: {e}") from e
+            if stats is not None:
+                stats['redaction_error'] = str(e)
+            else:
+                print(f"Redaction not available: {e}")
+    if stats is not None:
+        stats['redactions'] = counts
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    mean = balance_mean(original) if balance else None
+    
+    if gradient_colors:
+        gradient, gradient_resample = gradient_tile(size, gradient_colors,
+                                                    gradient_direction, gradient_stops)
+    shadow_alpha = shadow_tile(size, padding, corner_radius, shadow) if shadow > 0 else None
+    mark = watermark_strip(size[0]) if watermark else None
+    
+    # A background makes the output opaque, so the alpha channel is dropped
+    writer = PngStreamWriter(output_path, size, 'RGB' if gradient_colors else 'RGBA',
+                             encoding.compress_level)
+    try:
+        for top in range(0, size[1], band_height):
+            bottom = min(top + band_height, size[1])
+            band_size = (size[0], bottom - top)
+            if gradient_colors:
+                band = stretch_band(gradient, size, top, bottom, gradient_resample)
+            else:
+                band = Image.new('RGBA', band_size, (0, 0, 0, 0))
+            if shadow_alpha is not None:
+                shadow_band = Image.new('RGBA', band_size, (0, 0, 0, 0))
+                shadow_band.putalpha(stretch_band(shadow_alpha, size, top, bottom,
+                                                  Image.Resampling.BILINEAR))
+                band = Image.alpha_composite(band, shadow_band)
+            
+            # Screenshot rows in this band
+            first = max(top, padding) - padding
+            last = min(bottom, padding + height) - padding
+            if first < last:
+                foreground = original.crop((0, first, width, last)).convert('RGBA')
+                round_band_corners(foreground, first, corner_radius, (width, height))
+                if balance:
+                    foreground = apply_balance(foreground, mean)
+                band.alpha_composite(foreground, (padding, first + padding - top))
+            
+            if mark is not None and bottom > size[1] - 30:
+                mark_top = size[1] - 30
+                cut = max(0, top - mark_top)
+                band.alpha_composite(mark.crop((0, cut, size[0], 30)),
+                                     (0, mark_top + cut - top))
+            writer.write(band)
+    finally:
+        writer.close()
+    return size
+
+# Every option of a render, in one immutable, slotted and hashable object
+# that can be stored in a profile and used directly as a cache key
+class RenderSettings(namedtuple('RenderSettings', (
+        'corner_radius', 'gradient_colors', 'padding', 'shadow', 'balance',
+        'gradient_direction', 'gradient_stops', 'redact', 'redaction_style',
+        'watermark'),
+        defaults=(20, ((135, 206, 235), (147, 112, 219)), 50, 0, False,
+                  'vertical', None, (), 'solid', False))):
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, values):
+        unknown = set(values) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"Unknown render settings: {', '.join(sorted(unknown))}")
+        return cls(**{name: _freeze(value) for name, value in values.items()})
+
+    def to_dict(self):
+        return self._asdict()
+
+    def check(self):
+        # Type checks for settings that come from untrusted JSON; raises
+        # ValueError naming the first bad setting
+        for name in ('corner_radius', 'padding', 'shadow'):
+            value = getattr(self, name)
+            if not _is_int(value) or value < 0:
+                raise ValueError(f"{name} must be a non-negative integer")
+        for name in ('balance', 'watermark'):
+            if not isinstance(getattr(self, name), bool):
+                raise ValueError(f"{name} must be true or false")
+        colors = self.gradient_colors
+        if colors is not None and not (
+                isinstance(colors, tuple)
+                and all(isinstance(color, tuple) and len(color) in (3, 4)
+                        and all(_is_int(c) and 0 <= c <= 255 for c in color)
+                        for color in colors)):
+            raise ValueError("gradient_colors must be a list of [r, g, b] colors")
+        if self.gradient_direction not in GRADIENT_DIRECTIONS:
+            raise ValueError(f"gradient_direction must be one of {', '.join(GRADIENT_DIRECTIONS)}")
+        stops = self.gradient_stops
+        if stops is not None and not (
+                isinstance(stops, tuple)
+                and all(isinstance(stop, (int, float)) and not isinstance(stop, bool)
+                        for stop in stops)):
+            raise ValueError("gradient_stops must be a list of numbers")
+        if not (isinstance(self.redact, tuple)
+                and all(isinstance(name, str) for name in self.redact)):
+            raise ValueError("redact must be a list of detector names")
+        if self.redaction_style not in REDACTION_STYLES:
+            raise ValueError(f"redaction_style must be one of {', '.join(REDACTION_STYLES)}")
+        check_redaction(self.redact, self.redaction_style)
+        return self
+
+def render_settings(source, settings, **options):
+    # render_snippet with a RenderSettings; options are the per-call extras
+    # such as source_key or stats
+    return render_snippet(source, **settings._asdict(), **options)
+
+GRADIENT_PRESETS = {
+    'Desktop': ((255, 140, 0), (255, 98, 0)),     # Orange gradient
+    'Cool': ((135, 206, 235), (147, 112, 219)),   # Sky Blue to Purple
+    'Nice': ((255, 192, 203), (147, 112, 219)),   # Pink to Purple
+    'Morning': ((255, 182, 193), (255, 218, 185)), # Light Pink to Peach
+    'Bright': ((255, 140, 0), (138, 43, 226)),    # Orange to Purple
+    'Love': ((255, 105, 180), (138, 43, 226)),    # Hot Pink to Purple
+    'Rain': ((0, 191, 255), (138, 43, 226)),      # Deep Sky Blue to Purple
+    'Sky': ((135, 206, 235), (70, 130, 180)),     # Sky Blue to Steel Blue
+    'None': None,                                  # No gradient
+}
+
+# Profile with named render presets, the last used settings and custom
+# gradients. Derived assets are cached next to it
+PROFILE_PATH = Path.home() / '.wnapper' / 'profile.json'
+DEFAULT_PROFILE = {
+    'presets': {},
+    'last_used': {'background': 'Cool', 'settings': {}},
+    'custom_gradients': {
+        'Custom': {'colors': [[255, 126, 95], [254, 180, 123]], 'direction': 'diagonal'},
+    },
+    'last_capture_size': None,
+    'history': True,
+}
+
+def load_profile(path=None):
+    path = Path(path or PROFILE_PATH)
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    try:
+        profile.update(json.loads(path.read_text()))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Profile error: {e}")
+    return profile
+
+def save_profile(profile, path=None):
+    path = Path(path or PROFILE_PATH)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(profile, indent=2))
+    except OSError as e:
+        print(f"Profile error: {e}")
+
+def gradient_choices(profile):
+    # Background name -> (colors, direction, stops), or None for no gradient
+    choices = {name: (colors, 'vertical', None) if colors else None
+               for name, colors in GRADIENT_PRESETS.items()}
+    for name, gradient in profile.get('custom_gradients', {}).items():
+        choices[name] = (_freeze(gradient['colors']),
+                         gradient.get('direction', 'vertical'),
+                         _freeze(gradient.get('stops')))
+    return choices
+
+def profile_settings(profile):
+    # RenderSettings for the last used settings and every named preset.
+    # Presets are batch settings, so batch-only keys are dropped; a preset
+    # that still doesn't fit is skipped rather than failing the rest
+    settings = [RenderSettings.from_dict(profile['last_used'].get('settings', {}))]
+    for name, values in profile.get('presets', {}).items():
+        try:
+            values = normalize_render_settings(values)
+            values.pop('encoding', None)
+            values.pop('detectors', None)
+            settings.append(RenderSettings.from_dict(values))
+        except (TypeError, ValueError) as e:
+            print(f"Preset {name!r} skipped: {e}")
+    return settings
+
+def warm_profile_assets(profile):
+    # Precompute background, shadow and corner assets for the profile at the
+    # last capture size, so the first render after a hotkey press starts warm
+    size = profile.get('last_capture_size')
+    with persist_assets():
+        for settings in profile_settings(profile):
+            if settings.corner_radius > 0:
+                corner_masks(settings.corner_radius)
+            if not size:
+                continue
+            canvas = (size[0] + settings.padding * 2, size[1] + settings.padding * 2)
+            render_background(canvas, settings.gradient_colors,
+                              settings.gradient_direction, settings.gradient_stops)
+            render_shadow_layer(canvas, settings.padding, settings.corner_radius,
+                                settings.shadow)
+
+# Capture history: raw captures with the settings they were last rendered
+# with, indexed in SQLite with a thumbnail and cached OCR results. The same
+# pixels are stored once. Least recently used captures are evicted past
+# HISTORY_MAX_BYTES or HISTORY_MAX_AGE_DAYS (None for no limit). Captures
+# are kept unredacted; the history is off with HISTORY_DIR = None,
+# WNAPPER_HISTORY=0, "history": false in the profile or --no-history
+HISTORY_DIR = PROFILE_PATH.parent / 'history'
+HISTORY_MAX_BYTES = 2 * 1024 ** 3
+HISTORY_MAX_AGE_DAYS = 90
+HISTORY_THUMBNAIL_SIZE = (240, 160)
+HISTORY_ENCODING = 'archive'  # lossless, about a quarter of a PNG
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    hash TEXT UNIQUE NOT NULL,
+    file TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    background TEXT,
+    settings TEXT,
+    ocr_key TEXT,
+    ocr TEXT,
+    thumbnail BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_used ON captures (used);
+"""
+
+HistoryEntry = namedtuple('HistoryEntry', (
+    'id', 'created', 'used', 'width', 'height', 'bytes', 'background',
+    'settings', 'thumbnail'))
+
+def history_enabled(profile=None):
+    if not HISTORY_DIR or os.environ.get('WNAPPER_HISTORY', '1').lower() in (
+            '0', 'false', 'off', 'no'):
+        return False
+    return (profile or load_profile()).get('history', True) is not False
+
+class CaptureHistory:
+    # Safe to use from several threads: every call opens its own short
+    # SQLite connection
+    def __init__(self, directory=None, max_bytes=HISTORY_MAX_BYTES,
+                 max_age_days=HISTORY_MAX_AGE_DAYS):
+        self.directory = Path(directory or HISTORY_DIR)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        (self.directory / 'captures').mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / 'history.db'
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(HISTORY_SCHEMA)
+
+    def _connect(self):
+        import sqlite3
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _query(self, sql, params=()):
+        # Rows of a query, or the new row id for an insert
+        with self._lock:
+            db = self._connect()
+            try:
+                with db:
+                    cursor = db.execute(sql, params)
+                    if sql.startswith('INSERT'):
+                        return cursor.lastrowid if cursor.rowcount else None
+                    return cursor.fetchall()
+            finally:
+                db.close()
+
+    def add(self, image, settings=None, background=None):
+        # Store a capture and return its id. A capture with the same pixels
+        # is not stored again, only marked as used. The hash is taken of the
+        # image as it is stored, so a reopened capture is found again
+        image = drop_opaque_alpha(image)
+        key = image_hash(image)
+        now = time.time()
+        existing = self._query("SELECT id FROM captures WHERE hash = ?", (key,))
+        if existing:
+            capture_id = existing[0]['id']
+            self._query("UPDATE captures SET used = ? WHERE id = ?", (now, capture_id))
+        else:
+            encoding = resolve_encoding(HISTORY_ENCODING)
+            path = self.directory / 'captures' / f"{key}{encoding.extension}"
+            encode_image(image, path, encoding)
+            thumbnail = image.copy()
+            thumbnail.thumbnail(HISTORY_THUMBNAIL_SIZE)
+            output = BytesIO()
+            encode_image(thumbnail, output)
+            capture_id = self._query(
+                "INSERT OR IGNORE INTO captures (hash, file, width, height, bytes, "
+                "created, used, thumbnail) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path.name, image.width, image.height,
+                 path.stat().st_size + output.tell(), now, now, output.getvalue()))
+            if capture_id is None:
+                # Stored by another thread in the meantime
+                capture_id = self._query("SELECT id FROM captures WHERE hash = ?",
+                                         (key,))[0]['id']
+        if settings is not None:
+            self.update(capture_id, settings, background)
+        self.evict()
+        return capture_id
+
+    def update(self, capture_id, settings, background=None, image=None):
+        # Remember the settings a capture was rendered with. Given the image,
+        # its OCR results are saved too if redaction ran on it, unless a line
+        # matched a detector: that text is not written to the index in
+        # plaintext, and reopening the capture runs OCR again
+        ocr_key = ocr = None
+        if image is not None:
+            languages = tuple(OCR_LANGUAGES)
+            results = _ocr_cache_get(_ocr_cache_key(image, 1.5, 1.5, languages))
+            detectors = tuple(PII_DETECTORS)
+            if results is not None and not any(scan_pii(text, detectors)
+                                               for _, text, _ in results):
+                # Keyed on the stored image, which open() hands back
+                ocr_key = _ocr_cache_key(drop_opaque_alpha(image), 1.5, 1.5, languages)
+                ocr = json.dumps(results)
+        self._query(
+            "UPDATE captures SET settings = ?, background = ?, used = ?, "
+            "ocr_key = COALESCE(?, ocr_key), ocr = COALESCE(?, ocr) WHERE id = ?",
+            (json.dumps(settings.to_dict()), background, time.time(),
+             ocr_key if ocr else None, ocr, capture_id))
+
+    def entries(self, limit=None):
+        # Most recently used first, with PNG thumbnails
+        rows = self._query(
+            "SELECT id, created, used, width, height, bytes, background, settings, "
+            "thumbnail FROM captures ORDER BY used DESC LIMIT ?",
+            (-1 if limit is None else limit,))
+        return [HistoryEntry(row['id'], row['created'], row['used'], row['width'],
+                             row['height'], row['bytes'], row['background'],
+                             RenderSettings.from_dict(json.loads(row['settings']))
+                             if row['settings'] else None,
+                             row['thumbnail'])
+                for row in rows]
+
+    def open(self, capture_id=None):
+        # The capture (the most recent one by default) with its last
+        # settings and background. Its OCR results go back into the OCR
+        # cache, so redacting it again doesn't run OCR
+        if capture_id is None:
+            rows = self._query("SELECT * FROM captures ORDER BY used DESC LIMIT 1")
+        else:
+            rows = self._query("SELECT * FROM captures WHERE id = ?", (capture_id,))
+        if not rows:
+            raise KeyError(f"No capture {capture_id} in the history"
+                           if capture_id is not None else "The history is empty")
+        row = rows[0]
+        image = Image.open(self.directory / 'captures' / row['file'])
+        image.load()
+        if row['ocr']:
+            results = [(bbox, text, conf) for bbox, text, conf in json.loads(row['ocr'])]
+            _ocr_cache_put(row['ocr_key'], results, persist=False)
+        self._query("UPDATE captures SET used = ? WHERE id = ?", (time.time(), row['id']))
+        settings = (RenderSettings.from_dict(json.loads(row['settings']))
+                    if row['settings'] else None)
+        return image, settings, row['background']
+
+    def render(self, capture_id, output_path, overrides=None, encoding=None):
+        # Re-render a capture with its last settings, changed by a dict of
+        # overrides
+        image, last, _ = self.open(capture_id)
+        settings = RenderSettings.from_dict({**(last or RenderSettings()).to_dict(),
+                                             **(overrides or {})})
+        return create_rounded_snippet(image, output_path, encoding=encoding,
+                                      **settings.to_dict())
+
+    def remove(self, capture_id):
+        rows = self._query("SELECT file FROM captures WHERE id = ?", (capture_id,))
+        self._query("DELETE FROM captures WHERE id = ?", (capture_id,))
+        for row in rows:
+            (self.directory / 'captures' / row['file']).unlink(missing_ok=True)
+        return bool(rows)
+
+    def evict(self, max_bytes=None, max_age_days=None):
+        # Drop the least recently used captures past the age or size limit,
+        # always keeping the newest one. Returns how many were removed
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        rows = self._query("SELECT id, used, bytes FROM captures ORDER BY used DESC")
+        expired = []
+        total = 0
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        for index, row in enumerate(rows):
+            total += row['bytes']
+            if index and ((cutoff is not None and row['used'] < cutoff)
+                          or (max_bytes is not None and total > max_bytes)):
+                expired.append(row['id'])
+        for capture_id in expired:
+            self.remove(capture_id)
+        return len(expired)
+
+# Delay before a preview render starts, so a slider drag renders once per
+# pause instead of once per pixel moved
+PREVIEW_DEBOUNCE_MS = 40
+PREVIEW_POLL_MS = 15
+
+class PreviewScheduler:
+    # Renders previews on a worker thread. Requests made in quick succession
+    # are coalesced, a job that is replaced before it starts is dropped, and
+    # only the newest finished render is handed back to Tk via after()
+    def __init__(self, widget, render, on_result, delay=PREVIEW_DEBOUNCE_MS):
+        self.widget = widget
+        self.render = render
+        self.on_result = on_result
+        self.delay = delay
+        self.generation = 0
+        self.requested = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=100)
+        self._settings = None
+        self._requested_at = None
+        self._timer = None
+        self._job = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._results = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='preview-render',
+                                        daemon=True)
+        self._worker.start()
+        self._poll = self.widget.after(PREVIEW_POLL_MS, self._collect)
+
+    def request(self, settings, immediate=False):
+        # Called on the Tk thread with the current settings
+        self.requested += 1
+        self.generation += 1
+        self._settings = settings
+        self._requested_at = time.perf_counter()
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+        self._timer = self.widget.after(0 if immediate else self.delay, self._submit)
+
+    def _submit(self):
+        self._timer = None
+        job = (self.generation, self._settings, self._requested_at)
+        with self._lock:
+            if self._job is not None:
+                self.dropped += 1
+            self._job = job
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            with self._lock:
+                job, self._job = self._job, None
+            if job is None:
+                continue
+            generation, settings, requested_at = job
+            try:
+                result = self.render(settings)
+            except Exception as e:
+                result = e
+            self._results.put((generation, result, requested_at))
+
+    def _collect(self):
+        # Runs on the Tk thread; shows the newest result, drops older ones
+        newest = None
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if newest is not None:
+                self.dropped += 1
+            newest = item
+        if newest is not None:
+            generation, result, requested_at = newest
+            if isinstance(result, Exception):
+                print(f"Preview error: {result}")
+            else:
+                self.rendered += 1
+                self.latencies.append(time.perf_counter() - requested_at)
+                self.on_result(result)
+        if not self._closed:
+            self._poll = self.widget.after(PREVIEW_POLL_MS, self._collect)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'requested': self.requested,
+            'rendered': self.rendered,
+            'dropped': self.dropped,
+            'last_ms': round(self.latencies[-1] * 1000, 1) if latencies else None,
+            'median_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        for after_id in (self._timer, self._poll):
+            if after_id is not None:
+                try:
+                    self.widget.after_cancel(after_id)
+                except tk.TclError:
+                    pass
+
+def copy_image_to_clipboard(image):
+    # Put a rendered image on the system clipboard straight from memory
+    import subprocess
     
-    # Configure styles
-    style = ttk.Style()
+    if sys.platform == 'win32':
+        import win32clipboard
+        
+        # Convert image to BMP format for clipboard
+        output = BytesIO()
+        image.convert('RGB').save(output, 'BMP')
+        data = output.getvalue()[14:]  # Remove BMP header
+        
+        # Send to clipboard
+        win32clipboard.OpenClipboard()
+        try:
+            win32clipboard.EmptyClipboard()
+            win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
+        finally:
+            win32clipboard.CloseClipboard()
+    elif sys.platform == 'darwin':
+        # osascript can only read the picture from a file
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+            encode_image(image, f, 'interactive')
+        try:
+            subprocess.run(['osascript', '-e',
+                f'set the clipboard to (read (POSIX file "{f.name}") as «class PNGf»)'],
+                check=True)
+        finally:
+            Path(f.name).unlink()
+    else:
+        # Stream PNG bytes into the clipboard tool, no file on disk. Fast
+        # compression: the bytes only live until they are pasted
+        import shutil
+        output = BytesIO()
+        encode_image(image, output, 'interactive')
+        if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-copy'):
+            command = ['wl-copy', '--type', 'image/png']
+        else:
+            command = ['xclip', '-selection', 'clipboard', '-t', 'image/png', '-i']
+        subprocess.run(command, input=output.getvalue(), check=True)
+
+# Encoding profile for the copy the settings window saves to disk
+SAVE_ENCODING = 'default'
+
+def save_image_async(image, path, encoding=None):
+    # Encode and write on a background thread. Not a daemon thread, so the
+    # file is complete even if the program exits right after
+    def save():
+        try:
+            encode_image(image, path, encoding)
+        except Exception as e:
+            print(f"Save error: {e}")
+    thread = threading.Thread(target=save, name='save-output')
+    thread.start()
+    return thread
+
+def configure_styles(master):
+    # ttk styles for the settings window, configured once per Tk interpreter
+    style = ttk.Style(master)
     style.configure('Modern.TFrame', background='#f5f5f5')
     style.configure('Modern.TLabel', 
                    background='#f5f5f5', 
@@ -181,6 +1710,34 @@ def show_settings(screenshot_path, final_path):
     style.configure('Modern.TButton',
                    font=('Segoe UI', 11),
                    padding=10)
+    return style
+
+def show_settings(screenshot, final_path, master=None, on_close=None,
+                  on_first_preview=None, initial=None, on_apply=None):
+    # screenshot is an image or a path to one. final_path can be None to only
+    # copy the result to the clipboard.
+    # Without a master this runs its own Tk loop until the window is closed.
+    # With one, the window is a Toplevel of that (already styled) root and
+    # this returns right away; on_close is called once the window is gone.
+    # initial is a (RenderSettings, background name) pair to start from,
+    # on_apply is called with the same pair when the result is applied
+    # Start from the settings used last time
+    profile = load_profile()
+    gradients = gradient_choices(profile)
+    last = RenderSettings.from_dict(profile['last_used'].get('settings', {}))
+    background = profile['last_used'].get('background', 'Cool')
+    if initial is not None:
+        last, background = initial[0] or last, initial[1] or background
+    
+    # Create settings window, hidden until it is laid out and centered
+    if master is None:
+        settings = tk.Tk()
+        configure_styles(settings)
+    else:
+        settings = tk.Toplevel(master)
+    settings.withdraw()
+    settings.title("Ralph's xnapper copy but opensource")
+    settings.configure(bg='#f5f5f5')  # Light background
     
     # Main layout
     main_frame = ttk.Frame(settings, style='Modern.TFrame')
@@ -194,40 +1751,73 @@ def show_settings(screenshot_path, final_path):
     preview_label = ttk.Label(preview_frame, style='Modern.TLabel')
     preview_label.pack()
     
-    def update_preview(*args):
+    # Open the capture once and downscale it for previews; every preview
+    # renders from the same proxy pixels
+    if isinstance(screenshot, Image.Image):
+        source = screenshot
+    else:
+        source = Image.open(screenshot)
+        source.load()
+    proxy, proxy_scale = make_proxy(source)
+    proxy_key = image_hash(proxy)
+    
+    def render_preview(render):
+        # Runs on the preview worker thread
+        stats = {}
+        img = render_proxy(proxy, proxy_scale, source, source_key=proxy_key,
+                           stats=stats, **render._asdict())
+        # Padding can still push the proxy render past the preview size
+        img.thumbnail(PREVIEW_SIZE, Image.Resampling.LANCZOS)
+        return img, stats
+    
+    def show_preview(result):
+        nonlocal on_first_preview
+        img, stats = result
+        # Hand the pixels straight to Tk, no temporary file
+        settings.preview_image = ImageTk.PhotoImage(img)
+        preview_label.configure(image=settings.preview_image)
+        if on_first_preview:
+            # Lay out the new image before the preview counts as shown
+            settings.update_idletasks()
+            on_first_preview()
+            on_first_preview = None
+        
+        # Report what redaction found, or why it couldn't run
+        if stats.get('redaction_error'):
+            print(f"Redaction not available: {stats['redaction_error']}")
+            redact_var.set(False)
+            show_redaction_unavailable()
+            update_preview()
+        elif redact_var.get():
+            found = ', '.join(f"{count} {name}" for name, count
+                              in stats.get('redactions', {}).items() if count)
+            redact_checkbox.configure(
+                text=f"Redact sensitive text (found {found or 'nothing'})")
+        else:
+            redact_checkbox.configure(text="Redact sensitive text")
+    
+    scheduler = PreviewScheduler(settings, render_preview, show_preview)
+    
+    def current_settings():
+        # Read the current settings here; Tk variables belong to this thread
+        gradient = gradients.get(preset_var.get())
+        colors, direction, stops = gradient or (None, 'vertical', None)
+        return RenderSettings(
+            corner_radius=radius_var.get(),
+            gradient_colors=colors,
+            padding=padding_var.get(),
+            shadow=shadow_var.get(),
+            balance=balance_var.get(),
+            gradient_direction=direction,
+            gradient_stops=stops,
+            redact=DEFAULT_DETECTORS if redact_var.get() else (),
+            redaction_style=redaction_style_var.get(),
+            watermark=watermark_var.get()
+        )
+    
+    def update_preview(*args, immediate=False):
         try:
-            # Create temporary file for preview
-            preview_path = "temp_preview.png"
-            
-            # Create the processed image with current settings
-            create_rounded_snippet(
-                screenshot_path,
-                preview_path,
-                corner_radius=radius_var.get(),
-                gradient_colors=presets[preset_var.get()] if preset_var.get() != 'None' else None,
-                padding=padding_var.get(),
-                shadow=shadow_var.get(),
-                balance=balance_var.get(),
-                redact_emails=redact_var.get()
-            )
-            
-            # Update watermark setting
-            create_rounded_snippet.watermark = watermark_var.get()
-            
-            # Load and display preview image
-            img = Image.open(preview_path)
-            
-            # Scale image if too large
-            max_size = (600, 400)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            img.save(preview_path)
-            
-            # Update the preview image
-            settings.preview_image = tk.PhotoImage(file=preview_path)
-            preview_label.configure(image=settings.preview_image)
-            
-            # Clean up temporary file
-            Path(preview_path).unlink()
+            scheduler.request(current_settings(), immediate=immediate)
         except Exception as e:
             print(f"Preview error: {e}")
     
@@ -238,14 +1828,14 @@ def show_settings(screenshot_path, final_path):
     # Padding control
     ttk.Label(settings_frame, text="Padding", 
              style='Modern.TLabel').pack(anchor='w', pady=(0,5))
-    padding_var = tk.IntVar(value=50)
+    padding_var = tk.IntVar(value=last.padding)
     padding_slider = ttk.Scale(settings_frame, from_=0, to=100, 
                              orient='horizontal',
                              variable=padding_var,
                              command=update_preview)
     padding_slider.pack(fill='x', pady=(0,20))
     
-    balance_var = tk.BooleanVar(value=False)
+    balance_var = tk.BooleanVar(value=last.balance)
     ttk.Checkbutton(settings_frame, text="Balance",
                     variable=balance_var,
                     style='Modern.TCheckbutton',
@@ -260,7 +1850,7 @@ def show_settings(screenshot_path, final_path):
     border_frame.pack(side='left', fill='x', expand=True)
     ttk.Label(border_frame, text="Border Radius",
              style='Modern.TLabel').pack(anchor='w')
-    radius_var = tk.IntVar(value=20)
+    radius_var = tk.IntVar(value=last.corner_radius)
     radius_slider = ttk.Scale(border_frame, from_=0, to=40,
                             orient='horizontal',
                             variable=radius_var,
@@ -272,7 +1862,7 @@ def show_settings(screenshot_path, final_path):
     shadow_frame.pack(side='right', fill='x', expand=True)
     ttk.Label(shadow_frame, text="Shadow",
              style='Modern.TLabel').pack(anchor='w')
-    shadow_var = tk.IntVar(value=0)
+    shadow_var = tk.IntVar(value=last.shadow)
     shadow_slider = ttk.Scale(shadow_frame, from_=0, to=40,
                             orient='horizontal',
                             variable=shadow_var,
@@ -283,27 +1873,14 @@ def show_settings(screenshot_path, final_path):
     ttk.Label(settings_frame, text="Background",
              style='Modern.TLabel').pack(anchor='w', pady=(0,10))
     
-    presets = {
-        'Desktop': ((255, 140, 0), (255, 98, 0)),     # Orange gradient
-        'Cool': ((135, 206, 235), (147, 112, 219)),   # Sky Blue to Purple
-        'Nice': ((255, 192, 203), (147, 112, 219)),   # Pink to Purple
-        'Morning': ((255, 182, 193), (255, 218, 185)), # Light Pink to Peach
-        'Bright': ((255, 140, 0), (138, 43, 226)),    # Orange to Purple
-        'Love': ((255, 105, 180), (138, 43, 226)),    # Hot Pink to Purple
-        'Rain': ((0, 191, 255), (138, 43, 226)),      # Deep Sky Blue to Purple
-        'Sky': ((135, 206, 235), (70, 130, 180)),     # Sky Blue to Steel Blue
-        'None': None,                                  # No gradient
-        'Custom': None                                 # Custom gradient
-    }
-    
     # Create grid of preset buttons
     preset_frame = ttk.Frame(settings_frame, style='Modern.TFrame')
     preset_frame.pack(fill='x', pady=(0,20))
     
-    preset_var = tk.StringVar(value='Cool')
+    preset_var = tk.StringVar(value=background if background in gradients else 'Cool')
     row = 0
     col = 0
-    for preset in presets:
+    for preset in gradients:
         btn = ttk.Radiobutton(preset_frame, text=preset,
                              variable=preset_var,
                              value=preset,
@@ -315,19 +1892,14 @@ def show_settings(screenshot_path, final_path):
             col = 0
             row += 1
     
-    # Check if EasyOCR is available
-    easyocr_available = False
-    try:
-        import easyocr
-        easyocr_available = True
-    except ImportError:
-        pass
+    # Check if EasyOCR is available (without importing it here)
+    easyocr_available = ocr_available()
 
     # Additional options
-    redact_var = tk.BooleanVar(value=False)
+    redact_var = tk.BooleanVar(value=bool(last.redact) and easyocr_available)
     redact_checkbox = ttk.Checkbutton(
         settings_frame, 
-        text="Redact email addresses" + (" (EasyOCR not installed)" if not easyocr_available else ""),
+        text="Redact sensitive text" + (" (EasyOCR not installed)" if not easyocr_available else ""),
         variable=redact_var,
         style='Modern.TCheckbutton',
         command=update_preview,
@@ -335,7 +1907,18 @@ def show_settings(screenshot_path, final_path):
     )
     redact_checkbox.pack(anchor='w', pady=2)
     
-    watermark_var = tk.BooleanVar(value=False)
+    # How redacted text is hidden
+    redaction_style_frame = ttk.Frame(settings_frame, style='Modern.TFrame')
+    redaction_style_frame.pack(anchor='w', padx=(20,0))
+    redaction_style_var = tk.StringVar(value=last.redaction_style)
+    for style_name in REDACTION_STYLES:
+        ttk.Radiobutton(redaction_style_frame, text=style_name.capitalize(),
+                        variable=redaction_style_var,
+                        value=style_name,
+                        style='Modern.TRadiobutton',
+                        command=update_preview).pack(side='left', padx=5)
+    
+    watermark_var = tk.BooleanVar(value=last.watermark)
     ttk.Checkbutton(settings_frame, text="Show watermark",
                     variable=watermark_var,
                     style='Modern.TCheckbutton',
@@ -344,54 +1927,40 @@ def show_settings(screenshot_path, final_path):
     # Add Apply button at the bottom of settings_frame
     def apply_settings():
         try:
-            # Create final image
-            create_rounded_snippet(
-                screenshot_path,
-                final_path,
-                corner_radius=radius_var.get(),
-                gradient_colors=presets[preset_var.get()] if preset_var.get() != 'None' else None,
-                padding=padding_var.get(),
-                shadow=shadow_var.get(),
-                balance=balance_var.get(),
-                redact_emails=redact_var.get()
-            )
+            # Create final image in memory, at full resolution
+            render = current_settings()
+            with persist_assets():
+                image = render_settings(source, render)
+            
+            # Remember these settings for next time
+            profile['last_used'] = {'background': preset_var.get(),
+                                    'settings': render.to_dict()}
+            profile['last_capture_size'] = list(source.size)
+            save_profile(profile)
+            if on_apply:
+                on_apply(render, preset_var.get())
             
-            # Copy to clipboard
+            # Copy to clipboard first, saving to disk happens in the background
             try:
-                from PIL import ImageGrab
-                import win32clipboard
-                from io import BytesIO
-                
-                # Convert image to BMP format for clipboard
-                image = Image.open(final_path)
-                output = BytesIO()
-                image.convert('RGB').save(output, 'BMP')
-                data = output.getvalue()[14:]  # Remove BMP header
-                output.close()
-                
-                # Send to clipboard
-                win32clipboard.OpenClipboard()
-                win32clipboard.EmptyClipboard()
-                win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
-                win32clipboard.CloseClipboard()
+                copy_image_to_clipboard(image)
             except Exception as e:
                 print(f"Clipboard error: {e}")
-                # Try alternative method for non-Windows systems
-                try:
-                    import subprocess
-                    if sys.platform == 'darwin':  # macOS
-                        subprocess.run(['osascript', '-e', 
-                            f'set the clipboard to (read (POSIX file "{final_path}") as JPEG picture)'])
-                    elif sys.platform.startswith('linux'):  # Linux
-                        subprocess.run(['xclip', '-selection', 'clipboard', '-t', 'image/png', '-i', final_path])
-                except Exception as e:
-                    print(f"Alternative clipboard method error: {e}")
+            if final_path:
+                save_image_async(image, final_path, SAVE_ENCODING)
             
             # Close the settings window
-            settings.destroy()
+            close()
             
         except Exception as e:
             print(f"Apply error: {e}")
+    
+    def close():
+        scheduler.close()
+        print(f"Preview render stats: {scheduler.stats()}")
+        settings.destroy()
+        if on_close:
+            on_close()
+    settings.protocol('WM_DELETE_WINDOW', close)
 
     # Create Apply button with modern style
     apply_button = ttk.Button(
@@ -403,162 +1972,1018 @@ def show_settings(screenshot_path, final_path):
     apply_button.pack(pady=20)
 
     # Create initial preview
-    update_preview()
+    update_preview(immediate=True)
     
     # Center the window on screen
     settings.update_idletasks()
-    width = settings.winfo_width()
-    height = settings.winfo_height()
+    width = settings.winfo_reqwidth()
+    height = settings.winfo_reqheight()
     x = (settings.winfo_screenwidth() // 2) - (width // 2)
     y = (settings.winfo_screenheight() // 2) - (height // 2)
     settings.geometry(f'+{x}+{y}')
+    settings.deiconify()
+    settings.lift()
+    settings.focus_force()
     
-    settings.mainloop()
+    if master is None:
+        settings.mainloop()
+    return settings
 
-def take_screenshot():
-    # Create a transparent root window
-    root = tk.Tk()
-    root.attributes('-alpha', 0.1)
-    root.attributes('-fullscreen', True)
-    
-    # Create a canvas for drawing the selection rectangle
-    canvas = tk.Canvas(root, highlightthickness=0)
-    canvas.pack(fill='both', expand=True)
-    canvas.configure(cursor="cross")
-    
-    # Create magnifier window
-    magnifier = tk.Toplevel(root)
-    magnifier.overrideredirect(True)
-    magnifier.attributes('-topmost', True)
-    mag_size = 120  # Size of magnifier window
-    mag_canvas = tk.Canvas(magnifier, width=mag_size, height=mag_size)
-    mag_canvas.pack()
-    
-    # Variables to store coordinates
-    start_x = start_y = 0
-    selection_rect = None
-    
-    def update_magnifier(event):
+# Screen capture backend: 'auto', 'mss', 'pillow', 'pyautogui' or
+# 'fake:<image path>' to serve a fixed image as the screen (for testing
+# without a display). Can be overridden with WNAPPER_CAPTURE
+CAPTURE_BACKEND = os.environ.get('WNAPPER_CAPTURE', 'auto')
+
+# Capture backends grab one screen. origin is the top-left corner of the
+# last grab in screen coordinates, so the selection overlay can be put on the
+# same monitor; None where the backend always grabs the primary screen
+class MssCapture:
+    # XGetImage/XShm on X11, BitBlt on Windows, CoreGraphics on macOS
+    name = 'mss'
+    origin = None
+
+    def __init__(self):
+        import mss
+        self._mss = mss.mss()
+
+    def grab(self):
+        # First monitor only; the selection overlay is moved onto it
+        monitor = self._mss.monitors[1]
+        shot = self._mss.grab(monitor)
+        self.origin = (monitor['left'], monitor['top'])
+        return Image.frombuffer('RGB', shot.size, shot.bgra, 'raw', 'BGRX', 0, 1)
+
+class PillowCapture:
+    name = 'pillow'
+    origin = None
+
+    def grab(self):
+        from PIL import ImageGrab
+        return ImageGrab.grab().convert('RGB')
+
+class PyAutoGUICapture:
+    name = 'pyautogui'
+    origin = None
+
+    def grab(self):
+        import pyautogui
+        return pyautogui.screenshot().convert('RGB')
+
+class FakeFramebufferCapture:
+    # Serves a fixed image as the screen contents
+    name = 'fake'
+    origin = None
+
+    def __init__(self, framebuffer):
+        if not isinstance(framebuffer, Image.Image):
+            framebuffer = Image.open(framebuffer)
+        self.framebuffer = framebuffer.convert('RGB')
+
+    def grab(self):
+        return self.framebuffer.copy()
+
+def get_capture_backend(name=None):
+    name = name or CAPTURE_BACKEND
+    if name.startswith('fake:'):
+        return FakeFramebufferCapture(name[len('fake:'):])
+    backends = {'mss': MssCapture, 'pillow': PillowCapture,
+                'pyautogui': PyAutoGUICapture}
+    if name != 'auto':
+        return backends[name]()
+    for backend in (MssCapture, PillowCapture, PyAutoGUICapture):
         try:
-            # Get screen content around cursor
-            x, y = event.x_root, event.y_root
-            screenshot = pyautogui.screenshot(region=(x-10, y-10, 20, 20))
-            # Scale up the screenshot for magnifier
-            screenshot = screenshot.resize((mag_size, mag_size))
-            # Save and load as PNG instead of using PPM
-            temp_path = "temp_mag.png"
-            screenshot.save(temp_path)
-            photo = tk.PhotoImage(file=temp_path)
-            mag_canvas.delete("all")
-            mag_canvas.create_image(0, 0, image=photo, anchor="nw")
-            mag_canvas.image = photo  # Keep a reference
-            # Clean up temp file
-            Path(temp_path).unlink()
-            # Draw crosshair
-            mag_canvas.create_line(mag_size/2, 0, mag_size/2, mag_size, fill='red')
-            mag_canvas.create_line(0, mag_size/2, mag_size, mag_size/2, fill='red')
+            return backend()
+        except ImportError:
+            continue
+    raise RuntimeError("No screen capture backend available")
+
+class FrozenFrame:
+    # One full-screen grab taken when selection starts. The magnifier and the
+    # final region are served from it, so mouse motion never grabs the screen.
+    # Coordinates are relative to the overlay, which covers the grabbed
+    # screen; scale converts them to frame pixels on high-DPI displays
+    def __init__(self, image, scale=1.0, mag_size=120, mag_radius=10):
+        self.image = image
+        self.pixels = np.asarray(image)
+        self.scale = scale
+        self.mag_size = mag_size
+        self.mag_radius = mag_radius
+        # Preallocated magnifier buffer and nearest-neighbour sampling offsets
+        # (RGBA, because Pillow only shares memory with 4-byte pixel buffers)
+        self._mag = np.full((mag_size, mag_size, 4), 255, dtype=np.uint8)
+        self._mag_image = Image.frombuffer('RGBA', (mag_size, mag_size), self._mag,
+                                           'raw', 'RGBA', 0, 1)
+        steps = (np.arange(mag_size) * (2 * mag_radius) // mag_size) - mag_radius
+        self._offsets = steps.astype(np.intp)
+
+    def magnify(self, x, y):
+        # Magnified area around (x, y), rendered into the reused buffer.
+        # Pixels past the screen edge repeat the edge
+        height, width = self.pixels.shape[:2]
+        cx, cy = int(x * self.scale), int(y * self.scale)
+        offsets = (self._offsets * self.scale).astype(np.intp)
+        rows = np.clip(cy + offsets, 0, height - 1)
+        cols = np.clip(cx + offsets, 0, width - 1)
+        self._mag[..., :3] = self.pixels[rows[:, None], cols[None, :]]
+        return self._mag_image
+
+    def crop(self, left, top, width, height):
+        s = self.scale
+        return self.image.crop((round(left * s), round(top * s),
+                                round((left + width) * s), round((top + height) * s)))
+
+class SelectionOverlay:
+    # The fullscreen selection window and its magnifier. Built once, hidden,
+    # and shown again for every capture
+    def __init__(self, master, mag_size=120):
+        self.mag_size = mag_size
+        self.frame = None
+        self.on_select = None
+        self.on_cancel = None
+        self.on_visible = None
+        self.start_x = self.start_y = 0
+        self.selection_rect = None
+        
+        # Transparent fullscreen window
+        self.window = tk.Toplevel(master)
+        self.window.withdraw()
+        self.window.attributes('-alpha', 0.1)
+        self.window.attributes('-fullscreen', True)
+        
+        # Create a canvas for drawing the selection rectangle
+        self.canvas = tk.Canvas(self.window, highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+        self.canvas.configure(cursor="cross")
+        
+        # Create magnifier window
+        self.magnifier = tk.Toplevel(master)
+        self.magnifier.withdraw()
+        self.magnifier.overrideredirect(True)
+        self.magnifier.attributes('-topmost', True)
+        mag_canvas = tk.Canvas(self.magnifier, width=mag_size, height=mag_size)
+        mag_canvas.pack()
+        # One Tk photo for every selection, updated in place
+        self.mag_photo = ImageTk.PhotoImage('RGBA', (mag_size, mag_size))
+        mag_canvas.create_image(0, 0, image=self.mag_photo, anchor="nw")
+        # Draw crosshair
+        mag_canvas.create_line(mag_size/2, 0, mag_size/2, mag_size, fill='red')
+        mag_canvas.create_line(0, mag_size/2, mag_size, mag_size/2, fill='red')
+        
+        # Bind mouse events
+        self.canvas.bind('<Button-1>', self._on_mouse_down)
+        self.canvas.bind('<B1-Motion>', self._on_mouse_move)
+        self.canvas.bind('<ButtonRelease-1>', self._on_mouse_up)
+        # Add escape key to cancel
+        self.window.bind('<Escape>', self._on_escape)
+        self.window.bind('<Map>', self._on_map)
+    
+    def show(self, frame_image, on_select, on_cancel=None, on_visible=None,
+             origin=None):
+        # Start a selection on frame_image, the frozen screen contents, whose
+        # top-left corner is at origin on the screen (None for the primary
+        # screen). on_select gets the selected region and the mouse-up time
+        self.frame = FrozenFrame(frame_image, mag_size=self.mag_size)
+        self.on_select = on_select
+        self.on_cancel = on_cancel
+        self.on_visible = on_visible
+        if origin is not None:
+            # Fullscreen on the monitor that was grabbed
+            self.window.attributes('-fullscreen', False)
+            self.window.geometry(f"+{origin[0]}+{origin[1]}")
+            self.window.attributes('-fullscreen', True)
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+    
+    def hide(self):
+        # Clean up visual elements
+        if self.selection_rect:
+            self.canvas.delete(self.selection_rect)
+            self.selection_rect = None
+        self.magnifier.withdraw()
+        self.window.withdraw()
+        self.frame = None
+    
+    def _on_map(self, event):
+        # <Map> on a toplevel also fires for its children
+        if event.widget is self.window and self.on_visible:
+            on_visible, self.on_visible = self.on_visible, None
+            on_visible()
+    
+    def _update_magnifier(self, event):
+        try:
+            # Magnify the frozen frame around the cursor
+            self.mag_photo.paste(self.frame.magnify(event.x, event.y))
             # Position magnifier window near cursor but not under it
+            x, y = event.x_root, event.y_root
             offset_x = 10
             offset_y = 10
-            magnifier.geometry(f"{mag_size}x{mag_size}+{x+offset_x}+{y+offset_y}")
+            self.magnifier.geometry(f"{self.mag_size}x{self.mag_size}"
+                                    f"+{x+offset_x}+{y+offset_y}")
         except Exception as e:
             print(f"Magnifier error: {e}")
     
-    def on_mouse_down(event):
-        nonlocal start_x, start_y
-        start_x, start_y = event.x, event.y
-        magnifier.deiconify()  # Show magnifier
-        update_magnifier(event)
-        
-    def on_mouse_move(event):
-        nonlocal selection_rect
+    def _on_mouse_down(self, event):
+        # The overlay is mapped by now, so its own size gives the frame scale;
+        # the screen size would span every monitor on X11
+        self.frame.scale = self.frame.image.width / max(1, self.window.winfo_width())
+        self.start_x, self.start_y = event.x, event.y
+        self.magnifier.deiconify()  # Show magnifier
+        self._update_magnifier(event)
+    
+    def _on_mouse_move(self, event):
         if event.state & 0x0100:  # Check if left mouse button is held down
             # Remove previous rectangle
-            if selection_rect:
-                canvas.delete(selection_rect)
+            if self.selection_rect:
+                self.canvas.delete(self.selection_rect)
             # Draw new rectangle
-            selection_rect = canvas.create_rectangle(
-                start_x, start_y, event.x, event.y,
+            self.selection_rect = self.canvas.create_rectangle(
+                self.start_x, self.start_y, event.x, event.y,
                 outline='#0078D7',  # Windows blue color
                 width=2
             )
-            update_magnifier(event)
+            self._update_magnifier(event)
     
-    def on_mouse_up(event):
+    def _on_mouse_up(self, event):
+        released_at = time.perf_counter()
         end_x, end_y = event.x, event.y
-        # Clean up visual elements
-        if selection_rect:
-            canvas.delete(selection_rect)
-        magnifier.withdraw()  # Hide magnifier
-        root.quit()
+        frame = self.frame
+        self.hide()
         
         # Ensure coordinates are in the correct order
-        left = min(start_x, end_x)
-        top = min(start_y, end_y)
-        width = abs(end_x - start_x)
-        height = abs(end_y - start_y)
+        left = min(self.start_x, end_x)
+        top = min(self.start_y, end_y)
+        width = abs(end_x - self.start_x)
+        height = abs(end_y - self.start_y)
         
         # Take the screenshot of selected area
         if width > 0 and height > 0:
-            screenshot = pyautogui.screenshot(region=(left, top, width, height))
-            
-            # Create output directory if it doesn't exist
-            output_dir = Path("output")
-            output_dir.mkdir(exist_ok=True)
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            input_path = output_dir / f"screenshot_{timestamp}.png"
-            output_path = output_dir / f"processed_{timestamp}.png"
-            
-            # Save original screenshot
-            screenshot.save(input_path)
-            
-            # Ensure windows are destroyed
+            self.on_select(frame.crop(left, top, width, height), released_at)
+        elif self.on_cancel:
+            self.on_cancel()
+    
+    def _on_escape(self, event):
+        self.hide()
+        if self.on_cancel:
+            self.on_cancel()
+
+# Interaction latency target for the resident process
+LATENCY_TARGET_MS = 100
+
+class LatencyMetrics:
+    # Hotkey-to-overlay and mouse-up-to-preview latencies, in milliseconds
+    def __init__(self, target_ms=LATENCY_TARGET_MS):
+        self.target_ms = target_ms
+        self.samples = {}
+    
+    def record(self, name, started):
+        ms = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(name, deque(maxlen=100)).append(ms)
+        over = f" (over the {self.target_ms} ms target)" if ms > self.target_ms else ""
+        print(f"{name}: {ms:.0f} ms{over}")
+        return ms
+    
+    def stats(self):
+        stats = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats[name] = {
+                'count': len(ordered),
+                'median_ms': round(ordered[len(ordered) // 2], 1),
+                'max_ms': round(ordered[-1], 1),
+                'over_target': sum(ms > self.target_ms for ms in ordered),
+            }
+        return stats
+
+# How often the Tk thread checks for hotkey presses
+HOTKEY_POLL_MS = 10
+
+class ResidentApp:
+    # One hidden Tk root for the whole session, with the selection overlay
+    # and the ttk styles built at startup. The keyboard hook thread only
+    # queues events; every window is created and shown on the Tk thread
+    def __init__(self, once=False):
+        # once: quit the Tk loop after the first capture is done
+        from concurrent.futures import ThreadPoolExecutor
+        self.once = once
+        self.root = tk.Tk()
+        self.root.withdraw()
+        configure_styles(self.root)
+        self.overlay = SelectionOverlay(self.root)
+        self.metrics = LatencyMetrics()
+        self.events = queue.Queue()
+        self.busy = False
+        self._capture = None
+        # Captures are stored off the Tk thread, one at a time and in order
+        self.history = None
+        if history_enabled():
             try:
-                magnifier.destroy()
-                root.destroy()
-            except:
-                pass
-            
-            # Show settings window
-            show_settings(input_path, output_path)
-            
-            # Clean up original screenshot
-            input_path.unlink()
+                self.history = CaptureHistory()
+            except Exception as e:
+                print(f"History error: {e}")
+        self._history_jobs = ThreadPoolExecutor(max_workers=1,
+                                                thread_name_prefix='history')
+        self._poll = self.root.after(HOTKEY_POLL_MS, self._collect)
+    
+    def hotkey(self):
+        # Called on the keyboard hook thread
+        self.events.put(('capture', time.perf_counter()))
     
-    # Bind mouse events
-    canvas.bind('<Button-1>', on_mouse_down)
-    canvas.bind('<B1-Motion>', on_mouse_move)
-    canvas.bind('<ButtonRelease-1>', on_mouse_up)
+    def reopen_hotkey(self):
+        # Called on the keyboard hook thread
+        self.events.put(('reopen', time.perf_counter()))
     
-    # Add escape key to cancel
-    def on_escape(event):
-        magnifier.withdraw()
-        root.destroy()
-    root.bind('<Escape>', on_escape)
+    def stop(self):
+        # Safe to call from any thread
+        self.events.put(('quit', None))
     
-    # Initially hide magnifier
-    magnifier.withdraw()
+    def _collect(self):
+        while True:
+            try:
+                event, pressed_at = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == 'quit':
+                self.root.quit()
+                return
+            if event == 'reopen':
+                self.reopen()
+            else:
+                self.start_capture(pressed_at)
+        self._poll = self.root.after(HOTKEY_POLL_MS, self._collect)
     
-    # Start the selection process
-    root.mainloop()
+    def start_capture(self, pressed_at=None):
+        if self.busy:
+            print("A capture is already open")
+            return
+        pressed_at = pressed_at or time.perf_counter()
+        # Freeze the screen before the overlay is shown; the magnifier and
+        # the selected region are served from this one grab
+        try:
+            if self._capture is None:
+                self._capture = get_capture_backend()
+            frame_image = self._capture.grab()
+        except Exception as e:
+            print(f"Capture error: {e}")
+            self._finish()
+            return
+        self.busy = True
+        self.overlay.show(frame_image, self._on_select, self._finish,
+                          on_visible=lambda: self.metrics.record(
+                              "Hotkey to overlay", pressed_at),
+                          origin=self._capture.origin)
+    
+    def _history_task(self, func, *args):
+        def run():
+            try:
+                return func(*args)
+            except Exception as e:
+                print(f"History error: {e}")
+        return self._history_jobs.submit(run)
     
-    # Ensure windows are destroyed
+    def _on_select(self, screenshot, released_at):
+        # Keep the raw capture, so it can be restyled later
+        capture = self._history_task(self.history.add, screenshot) if self.history else None
+        self._edit(screenshot, capture,
+                   on_first_preview=lambda: self.metrics.record(
+                       "Mouse-up to first preview", released_at))
+    
+    def reopen(self, capture_id=None):
+        # Edit a capture from the history again, the last one by default,
+        # starting from the settings it was last rendered with
+        if self.busy:
+            print("A capture is already open")
+            return
+        if self.history is None:
+            print("The capture history is disabled")
+            self._finish()
+            return
+        try:
+            image, settings, background = self.history.open(capture_id)
+        except Exception as e:
+            print(f"History error: {e}")
+            self._finish()
+            return
+        self.busy = True
+        capture = self._history_task(self.history.add, image)
+        self._edit(image, capture, initial=(settings, background))
+    
+    def _edit(self, screenshot, capture, on_first_preview=None, initial=None):
+        # Create output directory if it doesn't exist
+        output_dir = Path("output")
+        output_dir.mkdir(exist_ok=True)
+        
+        # Generate filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        extension = resolve_encoding(SAVE_ENCODING).extension
+        output_path = output_dir / f"processed_{timestamp}{extension}"
+        
+        def remember(render, background):
+            # Settings and OCR results go to the history entry once it's stored
+            def update():
+                capture_id = capture.result()
+                if capture_id is not None:
+                    self.history.update(capture_id, render, background, screenshot)
+            self._history_task(update)
+        
+        # Show settings window for the region, straight from memory
+        try:
+            show_settings(screenshot, output_path, master=self.root,
+                          on_close=self._finish,
+                          on_first_preview=on_first_preview,
+                          initial=initial,
+                          on_apply=remember if capture else None)
+        except Exception as e:
+            print(f"Settings error: {e}")
+            self._finish()
+    
+    def _finish(self):
+        self.busy = False
+        if self.once:
+            self.root.quit()
+    
+    def run(self):
+        self.root.mainloop()
+        print(f"Latency stats: {self.metrics.stats()}")
+        self.root.destroy()
+        # Let stored captures finish writing
+        self._history_jobs.shutdown()
+
+def take_screenshot():
+    # A single capture without the resident listener
+    app = ResidentApp(once=True)
+    app.root.after(0, app.start_capture)
+    app.run()
+
+def reopen_capture(capture_id=None):
+    # Edit a capture from the history without the resident listener
+    app = ResidentApp(once=True)
+    app.root.after(0, app.reopen, capture_id)
+    app.run()
+
+def warm_resident(profile):
+    # Background warmup for the listener: modules the capture and render
+    # paths import lazily, the profile's assets and one small render
+    import importlib
+    for module in ('mss', 'PIL.ImageFilter', 'PIL.ImageEnhance',
+                   'PIL.ImageChops', 'subprocess'):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    warm_profile_assets(profile)
+    settings = RenderSettings.from_dict(profile['last_used'].get('settings', {}))
+    render_settings(Image.new('RGB', (64, 48), 'white'),
+                    settings._replace(redact=()))
+
+# Image types picked up when a directory is passed to batch mode
+BATCH_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+def load_render_settings(path):
+    # Keyword arguments for create_rounded_snippet from a JSON preset file.
+    # An optional "detectors" object adds custom PII patterns by name
+    settings = json.loads(Path(path).read_text())
+    if not isinstance(settings, dict):
+        raise ValueError(f"{path}: expected a JSON object of render settings")
+    return settings
+
+def normalize_render_settings(settings):
+    # Settings files may use redact_emails, the create_rounded_snippet
+    # shorthand for redact=['email'], which RenderSettings doesn't know.
+    # An explicit redact wins, as in render_snippet
+    settings = dict(settings)
+    if 'redact_emails' in settings:
+        redact_emails = settings.pop('redact_emails')
+        if settings.get('redact') is None:
+            settings['redact'] = ['email'] if redact_emails else []
+    return settings
+
+def find_batch_inputs(patterns):
+    # Expand directories and glob patterns (shells on Windows don't) into a
+    # sorted list of image files
+    inputs = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            inputs.update(p for p in path.iterdir()
+                          if p.suffix.lower() in BATCH_EXTENSIONS)
+        elif path.is_file():
+            inputs.add(path)
+        else:
+            inputs.update(Path(p) for p in glob.glob(pattern, recursive=True)
+                          if Path(p).suffix.lower() in BATCH_EXTENSIONS)
+    return sorted(inputs)
+
+def _batch_init(detectors):
+    global HEADLESS
+    HEADLESS = True
+    for name, pattern in detectors.items():
+        register_detector(name, pattern)
+
+def _batch_render(job):
+    # Runs in a worker process
+    input_path, output_path, settings = job
+    start = time.perf_counter()
+    # Huge canvases are written band by band to keep worker memory bounded
+    with Image.open(input_path) as probe:
+        padding = settings.get('padding', 50)
+        canvas = (probe.width + padding * 2) * (probe.height + padding * 2)
+    encoding = resolve_encoding(settings.get('encoding'))
+    if canvas >= TILED_MIN_PIXELS and encoding.format == 'png' and not encoding.colors:
+        width, height = write_snippet_tiled(input_path, output_path, **settings)
+    else:
+        image = create_rounded_snippet(input_path, output_path, **settings)
+        width, height = image.size
+    return input_path, width * height, time.perf_counter() - start
+
+def resolve_render_settings(settings_path=None, preset=None):
+    # A named preset from the profile, overridden by the settings file.
+    # Returns the settings and the newest modification time of their sources
+    settings = {}
+    settings_mtime = 0
+    if preset:
+        presets = load_profile().get('presets', {})
+        if preset not in presets:
+            raise SystemExit(f"No preset named {preset!r} in {PROFILE_PATH}")
+        settings.update(normalize_render_settings(presets[preset]))
+        settings_mtime = PROFILE_PATH.stat().st_mtime
+    if settings_path:
+        settings.update(normalize_render_settings(load_render_settings(settings_path)))
+        settings_mtime = max(settings_mtime, Path(settings_path).stat().st_mtime)
+    return settings, settings_mtime
+
+def run_batch(patterns, output_dir, settings_path=None, workers=None, force=False,
+              preset=None):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    settings, settings_mtime = resolve_render_settings(settings_path, preset)
+    settings.setdefault('watermark', False)
+    # Custom PII patterns, registered in every worker
+    detectors = settings.pop('detectors', {})
+    for name, pattern in detectors.items():
+        register_detector(name, pattern)
+    extension = resolve_encoding(settings.get('encoding')).extension
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Outputs are named by stem, so a.png and a.jpg, or same-named files from
+    # two directories, would overwrite each other
+    inputs = find_batch_inputs(patterns)
+    by_output = {}
+    for input_path in inputs:
+        by_output.setdefault(output_dir / f"{input_path.stem}{extension}", []).append(input_path)
+    clashes = [paths for paths in by_output.values() if len(paths) > 1]
+    if clashes:
+        raise SystemExit("Inputs with the same output name: " + "; ".join(
+            ", ".join(str(p) for p in paths) for paths in clashes))
+    
+    # Skip images whose output is newer than both the input and the presets
+    jobs = []
+    skipped = 0
+    for input_path in inputs:
+        output_path = output_dir / f"{input_path.stem}{extension}"
+        if not force and output_path.exists():
+            output_mtime = output_path.stat().st_mtime
+            if output_mtime >= max(input_path.stat().st_mtime, settings_mtime):
+                skipped += 1
+                continue
+        jobs.append((input_path, output_path, settings))
+    
+    print(f"{len(jobs)} to process, {skipped} up to date")
+    if not jobs:
+        return 0
+    
+    failed = 0
+    pixels = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_batch_init,
+                             initargs=(detectors,)) as pool:
+        futures = {pool.submit(_batch_render, job): job for job in jobs}
+        for future in as_completed(futures):
+            input_path = futures[future][0]
+            try:
+                _, size, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{input_path}: error: {e}")
+                continue
+            pixels += size
+            print(f"{input_path}: {seconds * 1000:.0f} ms")
+    elapsed = time.perf_counter() - start
+    done = len(jobs) - failed
+    print(f"Processed {done} images in {elapsed:.2f} s "
+          f"({done / elapsed:.1f} images/s, {pixels / elapsed / 1e6:.1f} MP/s)")
+    return 1 if failed else 0
+
+# Local render server. POST image bytes to /render (settings as JSON in the
+# X-Render-Settings header, or ?preset=<name>) and the PNG is streamed back
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8765
+SERVE_QUEUE_SIZE = 16  # requests waiting for a worker before 503 is returned
+SERVE_MAX_BYTES = 64 * 1024 * 1024
+SERVE_CHUNK_SIZE = 64 * 1024
+
+class _ChunkedResponse:
+    # Writable file for Image.save that streams the image with chunked transfer
+    # encoding. Headers go out with the first write, so anything that fails
+    # before encoding starts can still get an error response
+    def __init__(self, handler, stats, content_type='image/png'):
+        self.handler = handler
+        self.stats = stats
+        self.content_type = content_type
+        self.started = False
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= SERVE_CHUNK_SIZE:
+            self._send_chunk()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _send_chunk(self):
+        handler = self.handler
+        if not self.started:
+            if self.stats.get('redaction_error'):
+                # Never stream an image whose redaction did not run
+                raise RedactionError(f"Redaction failed: {self.stats['redaction_error']}")
+            self.started = True
+            handler.send_response(200)
+            handler.send_header('Content-Type', self.content_type)
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.send_header('X-Redactions', json.dumps(self.stats.get('redactions', {})))
+            handler.end_headers()
+        if self._buffer:
+            handler.wfile.write(b'%x\r\n' % len(self._buffer))
+            handler.wfile.write(self._buffer)
+            handler.wfile.write(b'\r\n')
+            self._buffer = bytearray()
+
+    def close(self):
+        self._send_chunk()
+        self.handler.wfile.write(b'0\r\n\r\n')
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'wnapper'
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            metrics = self.server.metrics()
+            self._send_json(200, {'status': 'ok',
+                                  'workers': metrics['workers'],
+                                  'queue_depth': metrics['queue_depth']})
+        elif path == '/metrics':
+            self._send_json(200, self.server.metrics())
+        else:
+            self._send_json(404, {'error': f"No such endpoint: {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/render':
+            self._send_json(404, {'error': f"No such endpoint: {url.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if not 0 < length <= SERVE_MAX_BYTES:
+            self.close_connection = True
+            self._send_json(413 if length else 411,
+                            {'error': f"Send the image as a body of 1 to {SERVE_MAX_BYTES} bytes"})
+            return
+        expect_continue = self.headers.get('Expect', '').lower() == '100-continue'
+        # Backpressure: refuse when the queue is full. A client that waits for
+        # 100 Continue never sends the upload; from any other the upload is
+        # read and thrown away, or it would see a reset instead of the 503
+        if not self.server.admit():
+            if not expect_continue:
+                self._discard_body(length)
+            self.close_connection = True
+            self._send_json(503, {'error': "Render queue is full"},
+                            headers={'Retry-After': '1'})
+            return
+        try:
+            if expect_continue:
+                self.send_response_only(100)
+                self.end_headers()
+            body = self.rfile.read(length)
+            try:
+                settings = self.server.request_settings(
+                    parse_qs(url.query).get('preset', [None])[0],
+                    self.headers.get('X-Render-Settings'))
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                image = Image.open(BytesIO(body))
+                image.load()
+            except Exception:
+                self._send_json(400, {'error': "Body is not a readable image"})
+                return
+            self._render(image, *settings)
+        finally:
+            self.server.leave()
+
+    def handle_expect_100(self):
+        # 100 Continue is sent by do_POST once the request is admitted
+        return True
+
+    def _discard_body(self, length):
+        while length > 0:
+            chunk = self.rfile.read(min(length, SERVE_CHUNK_SIZE))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    def _render(self, image, settings, encoding):
+        # Waits for a worker slot, then renders and streams the result
+        self.server.acquire()
+        stats = {}
+        response = _ChunkedResponse(self, stats, encoding.mime_type)
+        start = time.perf_counter()
+        ok = False
+        try:
+            create_rounded_snippet(image, response, stats=stats, encoding=encoding,
+                                   **settings)
+            response.close()
+            ok = True
+        except RedactionError as e:
+            # The OCR backend is missing or failing; the request may succeed
+            # elsewhere, but never without redaction
+            print(f"Render error: {e}")
+            self._send_json(503, {'error': str(e)})
+        except Exception as e:
+            print(f"Render error: {e}")
+            if response.started:
+                # Too late for a status code; a truncated stream tells the client
+                self.close_connection = True
+            else:
+                self._send_json(500, {'error': str(e)})
+        finally:
+            self.server.release(time.perf_counter() - start, ok)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+class RenderServer(ThreadingHTTPServer):
+    # Every connection gets a thread, but at most `workers` renders run at
+    # once and at most `queue_size` more wait for a slot. Threads rather than
+    # processes, so the OCR reader and the asset caches are shared and stay
+    # warm between requests
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, queue_size=SERVE_QUEUE_SIZE,
+                 settings=None, presets=None, quiet=False):
+        super().__init__(address, RenderRequestHandler)
+        self.workers = workers or os.cpu_count()
+        self.queue_size = queue_size
+        self.settings = settings or {}
+        self.presets = presets or {}
+        self.quiet = quiet
+        self.served = 0
+        self.failed = 0
+        self.rejected = 0
+        self.render_times = deque(maxlen=1000)
+        self._pending = 0  # admitted requests, rendering or waiting
+        self._active = 0
+        self._slots = threading.Semaphore(self.workers)
+        self._lock = threading.Lock()
+
+    def admit(self):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                return False
+            self._pending += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._pending -= 1
+
+    def acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            self._active += 1
+
+    def release(self, seconds, ok):
+        with self._lock:
+            self._active -= 1
+            if ok:
+                self.served += 1
+                self.render_times.append(seconds)
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def request_settings(self, preset=None, header=None):
+        # Server defaults, then the named preset, then the request's own JSON.
+        # Returns the render settings and the output encoding
+        settings = dict(self.settings)
+        if preset:
+            if preset not in self.presets:
+                raise ValueError(f"No preset named {preset!r}")
+            settings.update(normalize_render_settings(self.presets[preset]))
+        if header:
+            overrides = json.loads(header)
+            if not isinstance(overrides, dict):
+                raise ValueError("X-Render-Settings must be a JSON object")
+            settings.update(normalize_render_settings(overrides))
+        encoding = resolve_encoding(settings.pop('encoding', None))
+        return RenderSettings.from_dict(settings).check().to_dict(), encoding
+
+    def metrics(self):
+        with self._lock:
+            times = sorted(self.render_times)
+            pending, active = self._pending, self._active
+        def percentile(q):
+            if not times:
+                return None
+            return round(times[min(len(times) - 1, int(q * len(times)))] * 1000, 1)
+        return {
+            'workers': self.workers,
+            'active': active,
+            'queue_depth': pending - active,
+            'queue_size': self.queue_size,
+            'served': self.served,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+        }
+
+def run_server(host=SERVE_HOST, port=SERVE_PORT, workers=None,
+               queue_size=SERVE_QUEUE_SIZE, settings_path=None, preset=None):
+    global ASSET_CACHE_DIR
+    settings, _ = resolve_render_settings(settings_path, preset)
+    settings.setdefault('watermark', False)
+    for name, pattern in settings.pop('detectors', {}).items():
+        register_detector(name, pattern)
+    # Share the listener's asset cache and start warm
+    ASSET_CACHE_DIR = PROFILE_PATH.parent / 'cache'
+    profile = load_profile()
+    threading.Thread(target=warm_profile_assets, args=(profile,),
+                     name='asset-warmup', daemon=True).start()
+    if ocr_available():
+        warmup_ocr_reader()
+    server = RenderServer((host, port), workers, queue_size, settings,
+                          profile.get('presets', {}))
+    print(f"Serving on http://{host}:{server.server_port} "
+          f"({server.workers} workers, queue of {queue_size}). Press Ctrl+C to exit.")
     try:
-        root.destroy()
-        magnifier.destroy()
-    except:
+        server.serve_forever()
+    except KeyboardInterrupt:
         pass
+    finally:
+        server.server_close()
+    print(f"Render stats: {server.metrics()}")
+    return 0
 
-def on_hotkey():
-    take_screenshot()
+def run_history(action, capture_id=None, output=None, settings_path=None,
+                preset=None, limit=20, max_mb=None, max_days=None):
+    history = CaptureHistory()
+    if action == 'list':
+        for entry in history.entries(limit):
+            created = datetime.fromtimestamp(entry.created).strftime('%Y-%m-%d %H:%M')
+            print(f"{entry.id:>5}  {created}  {entry.width}x{entry.height}  "
+                  f"{entry.bytes / 1024:.0f} KB  {entry.background or '-'}")
+    elif action == 'open':
+        reopen_capture(capture_id)
+    elif action == 'render':
+        overrides = {}
+        if settings_path or preset:
+            overrides, _ = resolve_render_settings(settings_path, preset)
+        for name, pattern in overrides.pop('detectors', {}).items():
+            register_detector(name, pattern)
+        encoding = overrides.pop('encoding', None)
+        try:
+            history.render(capture_id, output, overrides, encoding)
+        except KeyError as e:
+            print(f"History error: {e.args[0]}")
+            return 1
+        print(f"Rendered capture {capture_id} to {output}")
+    elif action == 'evict':
+        removed = history.evict(max_mb * 1024 ** 2 if max_mb is not None else None,
+                                max_days)
+        print(f"Removed {removed} captures")
+    return 0
 
-# Register the hotkey
-keyboard.add_hotkey('ctrl+shift+q', on_hotkey)
+def run_listener():
+    global ASSET_CACHE_DIR
+    import keyboard
+    import signal
+    # Keep derived assets next to the profile
+    ASSET_CACHE_DIR = PROFILE_PATH.parent / 'cache'
+    app = ResidentApp()
+    # Modules, assets and OCR models load in the background; the hotkey
+    # works right away
+    threading.Thread(target=warm_resident, args=(load_profile(),),
+                     name='warmup', daemon=True).start()
+    if ocr_available():
+        warmup_ocr_reader()
+    # Register the hotkey (only when run as a script, so the rendering
+    # functions can be imported without installing a global hook)
+    keyboard.add_hotkey('ctrl+shift+q', app.hotkey)
+    keyboard.add_hotkey('ctrl+shift+r', app.reopen_hotkey)
+    keyboard.add_hotkey('ctrl+c', app.stop)
+    signal.signal(signal.SIGINT, lambda *args: app.stop())
+    print("Press Ctrl+Shift+Q to take a screenshot, Ctrl+Shift+R to edit the last "
+          "one again. Press Ctrl+C to exit.")
+    # Tk runs on the main thread until Ctrl+C
+    app.run()
+    keyboard.unhook_all_hotkeys()
 
 # Example usage
 if __name__ == "__main__":
-    print("Press Ctrl+Shift+Q to take a screenshot. Press Ctrl+C to exit.")
-    # Keep the program running
-    keyboard.wait('ctrl+c')
+    parser = argparse.ArgumentParser(
+        description="Screenshot beautifier. Without a command, waits for Ctrl+Shift+Q.")
+    parser.add_argument('--no-history', action='store_true',
+                        help="Don't keep captures in the history")
+    commands = parser.add_subparsers(dest='command')
+    batch_parser = commands.add_parser(
+        'batch', help="Apply the render settings to existing screenshots")
+    batch_parser.add_argument('inputs', nargs='+',
+                              help="Image files, directories or glob patterns")
+    batch_parser.add_argument('-o', '--output', default='output',
+                              help="Directory for processed images (default: output)")
+    batch_parser.add_argument('-s', '--settings',
+                              help="JSON file with create_rounded_snippet settings")
+    batch_parser.add_argument('-p', '--preset',
+                              help="Named preset from the profile file")
+    batch_parser.add_argument('-j', '--workers', type=int,
+                              help="Worker processes (default: one per core)")
+    batch_parser.add_argument('-f', '--force', action='store_true',
+                              help="Re-render outputs that are already up to date")
+    serve_parser = commands.add_parser(
+        'serve', help="Render images posted to a local HTTP server")
+    serve_parser.add_argument('--host', default=SERVE_HOST,
+                              help=f"Address to listen on (default: {SERVE_HOST})")
+    serve_parser.add_argument('--port', type=int, default=SERVE_PORT,
+                              help=f"Port to listen on (default: {SERVE_PORT})")
+    serve_parser.add_argument('-s', '--settings',
+                              help="JSON file with default render settings")
+    serve_parser.add_argument('-p', '--preset',
+                              help="Named preset from the profile file used as defaults")
+    serve_parser.add_argument('-j', '--workers', type=int,
+                              help="Concurrent renders (default: one per core)")
+    serve_parser.add_argument('-q', '--queue', type=int, default=SERVE_QUEUE_SIZE,
+                              help=f"Requests that may wait for a worker (default: {SERVE_QUEUE_SIZE})")
+    history_parser = commands.add_parser(
+        'history', help="List, edit again, re-render or evict stored captures")
+    history_commands = history_parser.add_subparsers(dest='action', required=True)
+    list_parser = history_commands.add_parser('list', help="Most recently used captures")
+    list_parser.add_argument('-n', '--limit', type=int, default=20)
+    open_parser = history_commands.add_parser(
+        'open', help="Edit a capture again in the settings window")
+    open_parser.add_argument('id', type=int, nargs='?',
+                             help="Capture id (default: the most recent)")
+    render_parser = history_commands.add_parser(
+        'render', help="Render a capture with its last settings")
+    render_parser.add_argument('id', type=int)
+    render_parser.add_argument('-o', '--output', required=True)
+    render_parser.add_argument('-s', '--settings',
+                               help="JSON file with settings to change")
+    render_parser.add_argument('-p', '--preset',
+                               help="Named preset from the profile file to apply")
+    evict_parser = history_commands.add_parser(
+        'evict', help="Remove captures past a size or age limit")
+    evict_parser.add_argument('--max-mb', type=float,
+                              help=f"Size limit (default: {HISTORY_MAX_BYTES // 1024 ** 2})")
+    evict_parser.add_argument('--max-days', type=float,
+                              help=f"Age limit (default: {HISTORY_MAX_AGE_DAYS})")
+    args = parser.parse_args()
+    
+    if args.command == 'history':
+        if args.action in ('list', 'render', 'evict'):
+            HEADLESS = True
+        sys.exit(run_history(args.action, getattr(args, 'id', None),
+                             getattr(args, 'output', None),
+                             getattr(args, 'settings', None),
+                             getattr(args, 'preset', None),
+                             getattr(args, 'limit', 20),
+                             getattr(args, 'max_mb', None),
+                             getattr(args, 'max_days', None)))
+    if args.command == 'batch':
+        HEADLESS = True
+        sys.exit(run_batch(args.inputs, args.output, args.settings,
+                           args.workers, args.force, args.preset))
+    if args.command == 'serve':
+        HEADLESS = True
+        sys.exit(run_server(args.host, args.port, args.workers, args.queue,
+                            args.settings, args.preset))
+    if args.no_history:
+        HISTORY_DIR = None
+    run_listener()